@@ -13,8 +13,13 @@ from recipes.views import (IngredientViewSet,
                            RecipeViewSet,
                            GetShortLinkView,
                            ShoppingCartView,
+                           ShoppingCartBulkView,
+                           ClearShoppingCartView,
+                           ShoppingListView,
                            DownloadShoppingCartView,
-                           FavoriteView)
+                           FavoriteView,
+                           FavoriteBulkView,
+                           RecipeResponseCacheStatsView)
 
 router = DefaultRouter()
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
@@ -35,6 +40,14 @@ urlpatterns = [
         'recipes/download_shopping_cart/',
         DownloadShoppingCartView.as_view()
     ),
+    path('recipes/shopping_list/', ShoppingListView.as_view()),
+    # Массовые операции со списком покупок и избранным
+    # объявлены до роутера, чтобы не совпасть с адресом рецепта.
+    path('recipes/shopping_cart/', ShoppingCartBulkView.as_view()),
+    path('recipes/shopping_cart/clear/', ClearShoppingCartView.as_view()),
+    path('recipes/favorite/', FavoriteBulkView.as_view()),
+    # Статистика кэша ответов, до роутера по той же причине.
+    path('recipes/cache_stats/', RecipeResponseCacheStatsView.as_view()),
     # Рецепты и ингридиенты.
     path('', include(router.urls)),
     path('recipes/<int:pk>/get-link/', GetShortLinkView.as_view()),
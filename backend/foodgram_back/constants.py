@@ -6,11 +6,73 @@ EMAIL_MAX_LENGTH = 254
 RECIPE_INGREDIENT_NAME_MAX_LENGTH = 256
 # Максимальная длина для единиц измерения.
 MEASUREMENT_UNIT_MAX_LENGTH = 10
-# Максимальная длина для кода короткой ссылки.
-# Почему 3? Потому что я не нашел в ТЗ конкретное значение,
-# в примере в документации код состоял из 3-х символов, поэтому решил взять 3.
-SHORT_LINK_CODE_MAX_LENGTH = 3
+# Максимальная длина для кода короткой ссылки: столько символов base62
+# достаточно для любого id рецепта (до 2^63). Старые случайные коды
+# состоят из 3-х символов, как в примере в документации.
+SHORT_LINK_CODE_MAX_LENGTH = 11
+# Минимальная длина кода короткой ссылки, вычисляемого по id рецепта.
+# Коды длиннее старых трехсимвольных, поэтому не совпадают с ними.
+SHORT_LINK_CODE_MIN_LENGTH = 4
+# Время хранения в кэше соответствия кода короткой ссылки рецепту
+# (в секундах).
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+# Время хранения в кэше отметки о несуществующем коде (в секундах).
+SHORT_LINK_MISSING_CACHE_TIMEOUT = 60
+# Количество подсказок при автодополнении ингредиентов по-умолчанию.
+INGREDIENT_AUTOCOMPLETE_LIMIT = 10
+# Максимальное количество подсказок при автодополнении ингредиентов.
+INGREDIENT_AUTOCOMPLETE_MAX_LIMIT = 50
+# Максимальное количество рецептов в одном запросе на массовое
+# добавление или удаление из избранного и списка покупок.
+RECIPE_BULK_MAX_SIZE = 100
 # Минимально возможное количество ингредиента.
 MIN_INGREDIENT_AMOUNT = 0
 # Минимальное время приготовления блюда.
 MIN_COOKING_TIME = 0
+# Размер списка покупок в байтах, до которого pdf собирается в памяти,
+# более объемные документы сбрасываются во временный файл на диске.
+SHOPPING_LIST_SPOOL_MAX_SIZE = 1024 * 1024
+# Максимальный размер pdf в байтах, который сохраняется в кэше.
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
+# Время хранения pdf со списком покупок в кэше (в секундах).
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+# Размер фрагмента в байтах при потоковой отдаче списка покупок.
+SHOPPING_LIST_CHUNK_SIZE = 64 * 1024
+# Период полураспада оценки популярности рецепта (в днях).
+TRENDING_HALF_LIFE_DAYS = 3
+# За сколько последних дней учитывается избранное в оценке популярности.
+TRENDING_WINDOW_DAYS = 30
+# Период пересчета оценки популярности в цикле (в секундах).
+TRENDING_UPDATE_INTERVAL = 60 * 60
+# Варианты изображения рецепта в формате WebP: название варианта ->
+# наибольшая сторона в пикселях (None - без уменьшения).
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'medium': 960,
+    'webp': None,
+}
+# Качество сжатия вариантов изображений в WebP.
+IMAGE_VARIANT_WEBP_QUALITY = 80
+# Количество попыток обработки изображения до удаления задачи из очереди.
+IMAGE_TASK_MAX_ATTEMPTS = 3
+# На сколько секунд задача резервируется за обработчиком;
+# по истечении срока она снова доступна другим обработчикам.
+IMAGE_TASK_LOCK_TIMEOUT = 5 * 60
+# Пауза между проверками пустой очереди изображений (в секундах).
+IMAGE_WORKER_POLL_INTERVAL = 2
+# Максимальный размер тела запроса с изображением в байтах,
+# совпадает с client_max_body_size в настройках nginx.
+IMAGE_UPLOAD_MAX_REQUEST_SIZE = 10 * 1024 * 1024
+# Максимальный размер загружаемого изображения в байтах.
+IMAGE_UPLOAD_MAX_SIZE = 7 * 1024 * 1024
+# Максимальные ширина и высота загружаемого изображения в пикселях.
+IMAGE_UPLOAD_MAX_DIMENSION = 8000
+# Размер фрагмента строки base64 при потоковом декодировании.
+BASE64_DECODE_CHUNK_SIZE = 64 * 1024
+# Время хранения в кэше ответов анонимным пользователям со списком
+# рецептов и рецептом (в секундах). Устаревшие ответы отсекаются
+# версиями при изменении рецептов, поэтому время большое.
+RECIPE_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+# Как часто процесс переносит свои счетчики попаданий в кэш ответов
+# и промахов в общий кэш (в секундах).
+RESPONSE_CACHE_STATS_FLUSH_INTERVAL = 10
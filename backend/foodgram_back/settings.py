@@ -105,6 +105,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Кэш должен быть общим для всех воркеров gunicorn,
+# поэтому по-умолчанию используется файловый кэш.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache')),
+        # В кэше хранятся короткие ссылки, pdf списков покупок, ответы
+        # API, отметки версий и счетчики; при заполнении Django удаляет
+        # треть записей, в том числе версию каталога, поэтому
+        # стандартных 300 записей мало.
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100_000)),
+        },
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 
 from . import models
+from .images import delete_variants_on_commit, enqueue_recipe_image
+from .utils import rebuild_shopping_lists
 
 User = get_user_model()
 
@@ -25,11 +27,23 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('author__username', 'name')
 
     list_display = ('name', 'author', 'pub_date', 'favorites_count')
-    readonly_fields = ('favorites_count',)
-
-    def favorites_count(self, obj):
-        return obj.favorite.count()
-    favorites_count.short_description = 'В избранном (количество)'
+    readonly_fields = ('favorites_count', 'cart_count')
+
+    def save_model(self, request, obj, form, change):
+        if change and 'image' in form.changed_data:
+            delete_variants_on_commit(obj)
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data and obj.image:
+            enqueue_recipe_image(obj)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Ингредиенты из админки меняются без сериализатора, поэтому
+        # списки покупок с этим рецептом собираются заново.
+        if change:
+            rebuild_shopping_lists(
+                User.objects.filter(shoppingcart__recipe=form.instance)
+            )
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,137 @@
+import bisect
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from .models import Ingredient
+from .representations import INGREDIENT_COLUMNS, ingredient_to_dict
+
+# Ключ общей для всех процессов версии справочника ингредиентов:
+# времени его последнего изменения в наносекундах.
+CATALOG_VERSION_CACHE_KEY = 'ingredient_catalog_version'
+
+# Наибольшая длина подстрок названий в индексе вхождений. Строки
+# не длиннее ищутся по индексу точно, более длинные - среди названий,
+# содержащих самую редкую из их триграмм.
+NGRAM_LENGTH = 3
+
+# Снимок справочника текущего процесса.
+_catalog = None
+
+
+def get_ngrams(value, length):
+    return {value[i:i + length] for i in range(len(value) - length + 1)}
+
+
+class IngredientCatalog:
+    """
+    Неизменяемый снимок справочника ингредиентов в памяти процесса.
+    Хранит отсортированный массив названий в нижнем регистре,
+    индекс подстрок длиной до NGRAM_LENGTH -> номера содержащих их
+    названий в этом массиве и отображение id -> представление
+    ингредиента, построенные один раз на снимок.
+    """
+    __slots__ = ('version', 'names', 'name_ids', 'ngrams', 'by_id')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.by_id = {row[0]: ingredient_to_dict(row, None) for row in rows}
+        ordered = sorted((ingredient['name'].lower(), pk)
+                         for pk, ingredient in self.by_id.items())
+        self.names = tuple(name for name, _ in ordered)
+        self.name_ids = tuple(pk for _, pk in ordered)
+        self.ngrams = {}
+        for index, name in enumerate(self.names):
+            for length in range(1, NGRAM_LENGTH + 1):
+                for ngram in get_ngrams(name, length):
+                    self.ngrams.setdefault(ngram, []).append(index)
+
+    def to_representation(self, pk):
+        return self.by_id[pk]
+
+    def get(self, pk):
+        if pk not in self.by_id:
+            return None
+        return self.to_representation(pk)
+
+    def all(self):
+        return [self.to_representation(pk) for pk in sorted(self.by_id)]
+
+    def startswith(self, value, limit=None):
+        """
+        Ингредиенты, название которых начинается с value,
+        в алфавитном порядке.
+        """
+        value = value.lower()
+        result = []
+        index = bisect.bisect_left(self.names, value)
+        while (index < len(self.names)
+               and self.names[index].startswith(value)
+               and (limit is None or len(result) < limit)):
+            result.append(self.to_representation(self.name_ids[index]))
+            index += 1
+        return result
+
+    def autocomplete(self, value, limit):
+        """
+        Не более limit ингредиентов: сначала совпадающие по началу
+        названия, затем содержащие строку внутри названия.
+        """
+        result = self.startswith(value, limit)
+        value = value.lower()
+        if not value:
+            return result
+        # Номера названий возрастают, поэтому совпадения
+        # остаются в алфавитном порядке.
+        candidates = min(
+            (self.ngrams.get(ngram, ())
+             for ngram in get_ngrams(value, min(len(value), NGRAM_LENGTH))),
+            key=len
+        )
+        for index in candidates:
+            if len(result) >= limit:
+                break
+            name = self.names[index]
+            if value in name and not name.startswith(value):
+                result.append(self.to_representation(self.name_ids[index]))
+        return result
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_CACHE_KEY)
+    return version
+
+
+def get_catalog_modified(version):
+    """
+    Время последнего изменения справочника ингредиентов по его версии.
+    """
+    return datetime.fromtimestamp(version / 10**9, tz=timezone.utc)
+
+
+def bump_catalog_version():
+    """
+    Помечает снимки справочника во всех процессах устаревшими.
+    Новая версия - текущее время, поэтому она же служит
+    временем изменения справочника для заголовка Last-Modified.
+    """
+    cache.set(CATALOG_VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def get_ingredient_catalog():
+    """
+    Возвращает актуальный снимок справочника ингредиентов,
+    перечитывая его из базы только после смены версии.
+    """
+    global _catalog
+    version = get_catalog_version()
+    if _catalog is None or _catalog.version != version:
+        _catalog = IngredientCatalog(
+            version,
+            Ingredient.objects.values_list(*INGREDIENT_COLUMNS)
+        )
+    return _catalog
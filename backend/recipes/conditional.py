@@ -0,0 +1,60 @@
+from hashlib import md5
+
+from django.utils.cache import (get_conditional_response,
+                                patch_vary_headers,
+                                quote_etag)
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """
+    Строит сильный ETag по версиям, от которых зависит ответ.
+    """
+    return quote_etag(
+        md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    )
+
+
+class ConditionalGetMixin:
+    """
+    Миксин для представлений, отвечающих на условные GET-запросы
+    (If-None-Match, If-Modified-Since) кодом 304 без сериализации.
+    ETag и время изменения вычисляются представлением по столбцам
+    версий до построения ответа.
+    """
+
+    def get_last_modified(self, *times):
+        """
+        Время изменения ответа с признаками, зависящими от пользователя.
+        Их изменения по столбцам версий не отследить, поэтому
+        Last-Modified отдается только анонимным пользователям,
+        для которых признаки постоянны.
+        """
+        if self.request.user.is_authenticated:
+            return None
+        return max(times)
+
+    def get_etag(self, *parts):
+        # Одно и то же состояние в разных форматах (json,
+        # браузерный API) - разные представления ресурса.
+        return make_etag(self.request.accepted_renderer.format, *parts)
+
+    def conditional_response(self, etag, last_modified, get_response):
+        """
+        Возвращает 304, если у клиента актуальная версия ответа,
+        иначе ответ get_response(). last_modified - datetime или None,
+        если ответ зависит от пользователя и время изменения
+        по столбцам версий определить нельзя.
+        """
+        timestamp = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(self.request, etag=etag,
+                                            last_modified=timestamp)
+        if response is None:
+            response = get_response()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+            # Признаки избранного и подписок зависят от токена.
+            patch_vary_headers(response, ('Authorization',))
+        return response
@@ -0,0 +1,145 @@
+import base64
+import binascii
+import uuid
+
+from PIL import Image
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from rest_framework import serializers
+
+from foodgram_back.constants import (BASE64_DECODE_CHUNK_SIZE,
+                                     IMAGE_UPLOAD_MAX_DIMENSION,
+                                     IMAGE_UPLOAD_MAX_SIZE,
+                                     RECIPE_IMAGE_VARIANTS)
+
+BASE64_HEADER_SEPARATOR = ';base64,'
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    """
+    Временный файл с декодированным изображением. Хранилище может
+    переместить его при сохранении, поэтому файл закрывается
+    методом close, который учитывает, что файла уже нет.
+    """
+
+    def __del__(self):
+        self.close()
+
+
+class StreamingImageField(serializers.ImageField):
+    """
+    Поле изображения, принимающее строку base64 (в том числе
+    с заголовком data:) или файл из multipart-запроса.
+    Base64 декодируется фрагментами во временный файл, а изображение
+    проверяется по заголовку, без декодирования пикселей, поэтому
+    загрузка не держит в памяти копии файла.
+    """
+    default_error_messages = {
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_format': 'Допустимые форматы изображения: {formats}.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_big': ('Ширина и высота изображения должны быть '
+                    'не больше {max_dimension} пикселей.'),
+    }
+    # Допустимые форматы Pillow и расширения файлов для них.
+    formats = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+    def to_internal_value(self, data):
+        if data in ('', None):
+            return None
+        if isinstance(data, str):
+            file = self.decode_base64(data)
+        elif isinstance(data, UploadedFile):
+            if data.size > IMAGE_UPLOAD_MAX_SIZE:
+                self.fail('too_large', max_size=IMAGE_UPLOAD_MAX_SIZE)
+            file = data
+        else:
+            self.fail('invalid_image')
+
+        try:
+            extension = self.check_image(file)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.name = f'{uuid.uuid4()}.{extension}'
+        return file
+
+    def decode_base64(self, data):
+        """
+        Декодирует строку base64 во временный файл фрагментами
+        по BASE64_DECODE_CHUNK_SIZE символов.
+        """
+        start = data.find(BASE64_HEADER_SEPARATOR)
+        start = 0 if start == -1 else start + len(BASE64_HEADER_SEPARATOR)
+        # Размер проверяется по длине строки до декодирования.
+        if (len(data) - start) // 4 * 3 > IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=IMAGE_UPLOAD_MAX_SIZE)
+
+        file = DecodedImageFile('image', None, 0, None)
+        rest = ''
+        try:
+            for offset in range(start, len(data), BASE64_DECODE_CHUNK_SIZE):
+                chunk = rest + ''.join(
+                    data[offset:offset + BASE64_DECODE_CHUNK_SIZE].split()
+                )
+                # Декодируются только полные группы по 4 символа,
+                # остаток переносится в следующий фрагмент.
+                end = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:end], validate=True))
+                rest = chunk[end:]
+            if rest:
+                raise binascii.Error('Неполная группа символов base64')
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_image')
+
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_image(self, file):
+        """
+        Проверяет формат и размеры изображения по заголовку файла
+        и возвращает расширение для имени файла.
+        """
+        try:
+            # Image.open читает только заголовок, пиксели
+            # декодируются лишь при обращении к ним.
+            with Image.open(file) as image:
+                image_format, (width, height) = image.format, image.size
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+
+        if image_format not in self.formats:
+            self.fail('invalid_format',
+                      formats=', '.join(self.formats.values()))
+        if max(width, height) > IMAGE_UPLOAD_MAX_DIMENSION:
+            self.fail('too_big', max_dimension=IMAGE_UPLOAD_MAX_DIMENSION)
+        file.content_type = Image.MIME[image_format]
+        return self.formats[image_format]
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Поле со ссылками на варианты изображения рецепта.
+    Пока варианты не построены, вместо них отдается
+    ссылка на исходное изображение.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        storage = recipe.image.storage
+        request = self.context.get('request')
+        urls = {}
+        for variant in RECIPE_IMAGE_VARIANTS:
+            name = recipe.image_variants.get(variant)
+            url = storage.url(name) if name else recipe.image.url
+            urls[variant] = (request.build_absolute_uri(url)
+                             if request is not None else url)
+        return urls
@@ -1,16 +1,17 @@
 from django_filters.rest_framework import FilterSet, NumberFilter
+from rest_framework.filters import BaseFilterBackend
 
 from .models import Recipe
 
 
 class RecipeFilter(FilterSet):
-    is_favorited = NumberFilter(method="filter_is_favorited")
-    is_in_shopping_cart = NumberFilter(method="filter_is_in_shopping_cart")
-    author = NumberFilter(field_name="author__id")
+    is_favorited = NumberFilter(method='filter_is_favorited')
+    is_in_shopping_cart = NumberFilter(method='filter_is_in_shopping_cart')
+    author = NumberFilter(field_name='author__id')
 
     class Meta:
         model = Recipe
-        fields = ("author", "is_favorited", "is_in_shopping_cart")
+        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
 
     def filter_is_favorited(self, queryset, name, value):
         if value == 1 and self.request.user.is_authenticated:
@@ -21,3 +22,29 @@ class RecipeFilter(FilterSet):
         if value == 1 and self.request.user.is_authenticated:
             return queryset.filter(shoppingcart__user=self.request.user)
         return queryset
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """
+    Сортировка ленты рецептов параметром ordering:
+    newest (по-умолчанию), popular или trending.
+    Курсорная пагинация берет порядок из get_ordering.
+    """
+    ordering_param = 'ordering'
+    default_ordering = 'newest'
+    orderings = {
+        'newest': ('-pub_date', '-id'),
+        'popular': ('-favorites_count', '-pub_date', '-id'),
+        'trending': ('-trending_score', '-pub_date', '-id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        value = request.query_params.get(self.ordering_param)
+        return self.orderings.get(
+            value, self.orderings[self.default_ordering]
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        return queryset.order_by(
+            *self.get_ordering(request, queryset, view)
+        )
@@ -0,0 +1,151 @@
+import io
+import logging
+import os
+from datetime import timedelta
+
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from foodgram_back.constants import (IMAGE_TASK_LOCK_TIMEOUT,
+                                     IMAGE_TASK_MAX_ATTEMPTS,
+                                     IMAGE_VARIANT_WEBP_QUALITY,
+                                     RECIPE_IMAGE_VARIANTS)
+from .models import ImageTask, Recipe
+from .response_cache import invalidate_recipe_responses
+from .utils import delete_file_on_commit, save_file_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Каталог хранилища для вариантов изображений.
+VARIANTS_DIR = 'variants'
+
+
+def get_variant_name(name, variant):
+    """
+    Функция возвращает имя файла варианта изображения name.
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return os.path.join(VARIANTS_DIR, f'{stem}_{variant}.webp')
+
+
+def build_variants(storage, name):
+    """
+    Функция строит варианты изображения name в формате WebP,
+    сохраняет их в хранилище и возвращает словарь
+    название варианта -> имя файла.
+    """
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {}
+    for variant, size in RECIPE_IMAGE_VARIANTS.items():
+        variant_image = image.copy()
+        if size is not None:
+            variant_image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        variant_image.save(buffer, 'WEBP',
+                           quality=IMAGE_VARIANT_WEBP_QUALITY)
+        variants[variant] = storage.save(get_variant_name(name, variant),
+                                         ContentFile(buffer.getvalue()))
+    return variants
+
+
+def enqueue_recipe_image(recipe):
+    """
+    Функция ставит изображение рецепта в очередь на обработку.
+    Задача создается после фиксации транзакции, когда
+    исходный файл уже записан в хранилище.
+    """
+    transaction.on_commit(lambda: ImageTask.objects.create(
+        recipe_id=recipe.id, image=recipe.image.name
+    ))
+
+
+def delete_variants_on_commit(recipe):
+    """
+    Функция сбрасывает варианты изображения рецепта и удаляет
+    их файлы после фиксации транзакции.
+    """
+    storage = recipe.image.storage
+    names = list(recipe.image_variants.values())
+    recipe.image_variants = {}
+    transaction.on_commit(lambda: [storage.delete(name) for name in names])
+
+
+def replace_recipe_image(recipe, image):
+    """
+    Функция заменяет изображение рецепта: прежний файл и его варианты
+    удаляются, а новый записывается в хранилище и ставится в очередь
+    на обработку после фиксации транзакции. Рецепт сохраняет
+    вызывающий код.
+    """
+    if recipe.image:
+        delete_file_on_commit(recipe.image.storage, recipe.image.name)
+        delete_variants_on_commit(recipe)
+    save_file_on_commit(recipe, 'image', image)
+    enqueue_recipe_image(recipe)
+
+
+def claim_task():
+    """
+    Функция резервирует за текущим обработчиком первую свободную
+    задачу и возвращает ее или None, если очередь пуста.
+    Резервирование - условный UPDATE, поэтому задачу
+    получает только один из обработчиков.
+    """
+    while True:
+        now = timezone.now()
+        available = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+        task = ImageTask.objects.filter(available).first()
+        if task is None:
+            return None
+        claimed = ImageTask.objects.filter(available, pk=task.pk).update(
+            locked_until=now + timedelta(seconds=IMAGE_TASK_LOCK_TIMEOUT),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            task.attempts += 1
+            return task
+
+
+def process_task(task):
+    """
+    Функция строит варианты изображения по задаче и сохраняет их
+    у рецепта, если его изображение с тех пор не сменилось.
+    При ошибке задача остается в очереди и повторяется после
+    окончания резервирования, но не более IMAGE_TASK_MAX_ATTEMPTS раз.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    if not Recipe.objects.filter(pk=task.recipe_id,
+                                 image=task.image).exists():
+        task.delete()
+        return
+
+    try:
+        variants = build_variants(storage, task.image)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', task.image)
+        if task.attempts >= IMAGE_TASK_MAX_ATTEMPTS:
+            task.delete()
+        return
+
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            pk=task.recipe_id, image=task.image
+        ).update(image_variants=variants, updated_at=timezone.now())
+        task.delete()
+        if updated:
+            # Обновление без сигналов: кэш ответов сбрасывается здесь.
+            transaction.on_commit(
+                lambda: invalidate_recipe_responses([task.recipe_id])
+            )
+    if not updated:
+        # Изображение сменилось во время обработки.
+        for name in variants.values():
+            storage.delete(name)
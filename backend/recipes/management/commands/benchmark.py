@@ -0,0 +1,848 @@
+import base64
+import io
+import json
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.models import Count, Q
+from django.shortcuts import get_object_or_404, redirect
+from django.test import TestCase
+from django.test.client import encode_multipart
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.filters import SearchFilter
+from rest_framework.pagination import Cursor
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import (APIClient,
+                                 APIRequestFactory,
+                                 force_authenticate)
+from rest_framework.views import APIView
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from foodgram_back.constants import (INGREDIENT_AUTOCOMPLETE_LIMIT,
+                                     TRENDING_WINDOW_DAYS)
+from recipes import images, utils
+from recipes.catalog import (IngredientCatalog,
+                             bump_catalog_version,
+                             get_ingredient_catalog)
+from recipes.fields import StreamingImageField
+from recipes.filters import RecipeOrderingFilter
+from recipes.models import (Favorite,
+                            Ingredient,
+                            Recipe,
+                            RecipeIngredient,
+                            ShoppingCart,
+                            ShortLink)
+from recipes.renderers import FastJSONRenderer
+from recipes.representations import (INGREDIENT_COLUMNS,
+                                     RECIPE_COLUMNS,
+                                     RECIPE_IMAGE_STORAGE,
+                                     USER_WITH_RECIPES_COLUMNS,
+                                     get_recipes,
+                                     get_subscriptions,
+                                     ingredient_to_dict)
+from recipes.serializers import IngredientSerializer, RecipeReadSerializer
+from recipes.views import IngredientViewSet, ShortLinkView
+from users.models import Subscription, User
+from users.pagination import RecipeCursorPagination
+from users.serializers import UserWithRecipesSerializer
+from users.views import UserAvatarView
+
+# Число повторов каждого замера по умолчанию.
+REPEAT = 50
+
+# Слоги названий ингредиентов.
+SYLLABLES = ('ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло',
+             'му', 'ны', 'по', 'ра', 'се', 'ту', 'фа', 'хо')
+
+
+def percentile(timings, value):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * value / 100))]
+
+
+def get_ingredient_name(number):
+    """
+    Псевдослучайное название из слогов: совпадения по началу
+    и по вхождению распределены по словарю, а не сгруппированы.
+    """
+    value = number * 2654435761 % 2**32
+    syllables = []
+    for _ in range(3 + number % 3):
+        value, index = divmod(value, len(SYLLABLES))
+        syllables.append(SYLLABLES[index])
+    return f'{"".join(syllables).capitalize()} {number}'
+
+
+def make_photo(width, height):
+    """
+    JPEG размера width x height, по сжимаемости близкий к фотографии:
+    плавные пятна из увеличенного шума.
+    """
+    channels = [
+        Image.effect_noise((width // 8, height // 8), sigma).resize(
+            (width, height), Image.Resampling.BICUBIC
+        )
+        for sigma in (40, 60, 80)
+    ]
+    buffer = io.BytesIO()
+    Image.merge('RGB', channels).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def get_base64_image(content):
+    """
+    Изображение в base64, как его передает фронтенд.
+    """
+    return 'data:image/jpeg;base64,' + base64.b64encode(content).decode()
+
+
+class DatabaseIngredientViewSet(ReadOnlyModelViewSet):
+    """
+    Прежний вьюсет ингредиентов: каждый запрос читает базу
+    и сериализует ингредиенты через IngredientSerializer.
+    """
+    queryset = Ingredient.objects.all()
+    serializer_class = IngredientSerializer
+    filter_backends = (SearchFilter,)
+    search_fields = ('^name',)
+
+
+class DatabaseShortLinkView(APIView):
+    """
+    Прежнее представление короткой ссылки: два запроса к базе
+    на каждый переход.
+    """
+    def get(self, request, code):
+        short_link = get_object_or_404(ShortLink, code=code)
+        return redirect(f'/recipes/{short_link.recipe.id}')
+
+
+class Base64AvatarSerializer(serializers.ModelSerializer):
+    """
+    Прежний сериализатор аватара с Base64ImageField.
+    """
+    avatar = Base64ImageField(required=True)
+
+    class Meta:
+        model = User
+        fields = ('avatar',)
+
+
+class Base64AvatarView(APIView):
+    """
+    Прежнее представление смены аватара.
+    """
+    def put(self, request):
+        serializer = Base64AvatarSerializer(request.user, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({'avatar': request.user.avatar.url})
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа частых запросов на сгенерированных '
+            'данных. Данные создаются в транзакции, которая '
+            'откатывается после каждого сценария.')
+
+    scenarios = ('pagination', 'shopping_list', 'autocomplete', 'catalog',
+                 'ordering', 'feed', 'short_link', 'images', 'upload',
+                 'conditional', 'response_cache', 'serialization')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                            help='Сценарии: '
+                                 f'{", ".join(self.scenarios)}. '
+                                 'По умолчанию - все.')
+        parser.add_argument('--repeat', type=int, default=REPEAT,
+                            help='Число повторов каждого замера.')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'] or self.scenarios
+        unknown = set(scenarios) - set(self.scenarios)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}.'
+            )
+        self.repeat = options['repeat']
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                MEDIA_ROOT=media_root,
+                CACHES={'default': {
+                    'BACKEND':
+                        'django.core.cache.backends.locmem.LocMemCache',
+                    'OPTIONS': {'MAX_ENTRIES': 100_000},
+                }}
+            ):
+                for name in scenarios:
+                    self.stdout.write(self.style.MIGRATE_HEADING(name))
+                    cache.clear()
+                    with transaction.atomic():
+                        getattr(self, f'benchmark_{name}')()
+                        transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def measure(self, label, func, repeat=None, status=None):
+        """
+        Выполняет func repeat раз и выводит медиану и 99-й процентиль
+        времени выполнения, число вызовов в секунду и запросов к базе
+        за вызов. Ответ func должен быть успешным или с кодом status.
+        """
+        response = func()
+        code = getattr(response, 'status_code', None)
+        if code is not None and (code != status if status else code >= 400):
+            raise CommandError(f'{label}: ответ с кодом {code}.')
+        # Журнал запросов ограничен по длине: после заполнения
+        # при создании данных новые запросы в нем не подсчитать.
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            func()
+        timings = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f'  {label:<44} p50 {percentile(timings, 50):8.2f} ms  '
+            f'p99 {percentile(timings, 99):8.2f} ms  '
+            f'{1000 * len(timings) / sum(timings):7.0f} rps  '
+            f'{len(context.captured_queries):3} SQL'
+        )
+        return timings
+
+    def measure_memory(self, label, func, repeat=3):
+        """
+        Выводит наименьший за repeat вызовов пик памяти интерпретатора
+        (tracemalloc) сверх занятой до вызова func.
+        """
+        func()
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(repeat):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                func()
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(
+            f'  {label:<44} пик {min(peaks) / 2**20:8.1f} MB'
+        )
+
+    @staticmethod
+    def get_client(user=None):
+        """
+        Клиент API. Ответы анонимам кэшируются, поэтому для замеров
+        сериализации клиент авторизуется.
+        """
+        client = APIClient(raise_request_exception=True)
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    @staticmethod
+    def create_users(count, prefix='user'):
+        return User.objects.bulk_create(
+            User(email=f'{prefix}{i}@example.com', username=f'{prefix}{i}',
+                 first_name='Имя', last_name='Фамилия')
+            for i in range(count)
+        )
+
+    @staticmethod
+    def create_recipes(authors, count):
+        return Recipe.objects.bulk_create(
+            (Recipe(author=authors[i % len(authors)], name=f'Рецепт {i}',
+                    text='Описание', cooking_time=5)
+             for i in range(count)),
+            batch_size=5000
+        )
+
+    @staticmethod
+    def create_ingredients(count, per_recipe=0, recipes=()):
+        """
+        Создает count ингредиентов и по per_recipe из них
+        в каждом рецепте recipes.
+        """
+        ingredients = Ingredient.objects.bulk_create(
+            (Ingredient(name=get_ingredient_name(i), measurement_unit='г')
+             for i in range(count)),
+            batch_size=5000
+        )
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(i * 7 + j) % count],
+                amount=j + 1
+            ) for i, recipe in enumerate(recipes)
+              for j in range(per_recipe)),
+            batch_size=5000
+        )
+        return ingredients
+
+    def benchmark_pagination(self, pages=(1, 10, 100, 1000, 10_000),
+                             limit=10):
+        """
+        Страница ленты рецептов по номеру (COUNT(*) и OFFSET)
+        и по курсору на разной глубине ленты.
+        """
+        users = self.create_users(10)
+        self.create_recipes(users, pages[-1] * limit + limit)
+        client = self.get_client(users[0])
+        ordering = RecipeCursorPagination.ordering
+        recipes = Recipe.objects.order_by(*ordering)
+        paginator = RecipeCursorPagination()
+        paginator.base_url = (
+            f'http://testserver/api/recipes/?limit={limit}&cursor='
+        )
+        for page in pages:
+            self.measure(f'page={page}',
+                         lambda: client.get('/api/recipes/',
+                                            {'page': page, 'limit': limit}))
+            if page == 1:
+                url = paginator.base_url
+            else:
+                # Позиция курсора - последний рецепт предыдущей страницы.
+                position = recipes.values_list(
+                    *(field.lstrip('-') for field in ordering)
+                )[(page - 1) * limit - 1]
+                url = paginator.encode_cursor(Cursor(
+                    offset=0, reverse=False,
+                    position=paginator._get_position_from_instance(
+                        dict(zip((field.lstrip('-') for field in ordering),
+                                 position)),
+                        ordering
+                    )
+                ))
+            self.measure(f'cursor, page {page}', lambda: client.get(url))
+
+    def benchmark_shopping_list(self, cart_sizes=(10, 100, 1000)):
+        """
+        Скачивание списка покупок из cart_sizes рецептов в каждом
+        формате. Для pdf - первая отрисовка документа и повторная
+        для неизменившегося списка.
+        """
+        users = self.create_users(len(cart_sizes))
+        recipes = self.create_recipes(users, max(cart_sizes))
+        self.create_ingredients(2000, 10, recipes)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe)
+            for user, size in zip(users, cart_sizes)
+            for recipe in recipes[:size]
+        )
+        utils.rebuild_shopping_lists()
+
+        # Прежде шрифт регистрировался при каждом скачивании pdf.
+        self.measure('регистрация шрифта pdf',
+                     utils.register_pdf_font.__wrapped__)
+
+        def download(client, format, cached=False):
+            if not cached:
+                cache.clear()
+            response = client.get('/api/recipes/download_shopping_cart/',
+                                  {'format': format})
+            b''.join(response.streaming_content)
+            return response
+
+        for user, size in zip(users, cart_sizes):
+            client = self.get_client(user)
+            for format in ('txt', 'csv', 'pdf'):
+                self.measure(f'{size} рецептов, {format}',
+                             lambda: download(client, format))
+            self.measure(f'{size} рецептов, pdf из кэша',
+                         lambda: download(client, 'pdf', True))
+
+    def benchmark_autocomplete(self, sizes=(2000, 200_000),
+                               values=('ба', 'фахо', 'кижуту', '1234', 'нет')):
+        """
+        Подсказки ингредиентов в справочниках размера sizes: поиск
+        по началу названия в базе (прежний SearchFilter), перебор всех
+        названий снимка (прежний поиск по вхождению) и индекс подстрок.
+        """
+        client = self.get_client()
+        limit = INGREDIENT_AUTOCOMPLETE_LIMIT
+
+        def scan(catalog, value):
+            result = catalog.startswith(value, limit)
+            for name, pk in zip(catalog.names, catalog.name_ids):
+                if len(result) >= limit:
+                    break
+                if value in name and not name.startswith(value):
+                    result.append(catalog.to_representation(pk))
+            return result
+
+        created = 0
+        for size in sizes:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=get_ingredient_name(i),
+                            measurement_unit='г')
+                 for i in range(created, size)),
+                batch_size=5000
+            )
+            created = size
+            rows = list(Ingredient.objects.values_list(*INGREDIENT_COLUMNS))
+            self.measure(f'{size} ингредиентов, построение снимка',
+                         lambda: IngredientCatalog(0, rows), repeat=5)
+            bump_catalog_version()
+            catalog = get_ingredient_catalog()
+            for value in values:
+                label = f'{size} ингредиентов, "{value}"'
+                self.measure(f'{label}, istartswith', lambda: list(
+                    Ingredient.objects.filter(
+                        name__istartswith=value
+                    ).values('id', 'name', 'measurement_unit')
+                ))
+                self.measure(f'{label}, перебор',
+                             lambda: scan(catalog, value))
+                self.measure(f'{label}, индекс',
+                             lambda: catalog.autocomplete(value, limit))
+                self.measure(f'{label}, GET', lambda: client.get(
+                    '/api/ingredients/autocomplete/', {'name': value}
+                ))
+
+    def benchmark_catalog(self, size=2200):
+        """
+        Список, один ингредиент и поиск по началу названия: из снимка
+        справочника в памяти и прежним вьюсетом из базы.
+        """
+        ingredients = self.create_ingredients(size)
+        pk = ingredients[size // 2].pk
+        factory = APIRequestFactory()
+        requests = {
+            'список': ('list', {}, {}),
+            'один ингредиент': ('retrieve', {'pk': pk}, {}),
+            'поиск "Ба"': ('list', {}, {'name': 'Ба'}),
+        }
+        for label, (action, kwargs, query) in requests.items():
+            for name, viewset in (('база', DatabaseIngredientViewSet),
+                                  ('снимок', IngredientViewSet)):
+                view = viewset.as_view({'get': action})
+                self.measure(f'{label}, {name}', lambda: view(
+                    factory.get('/api/ingredients/', query), **kwargs
+                ).render())
+
+    def benchmark_ordering(self, users_count=2000, recipes_count=5000,
+                           per_user=500):
+        """
+        Первая страница популярных и набирающих популярность рецептов
+        по users_count * per_user записям избранного: группировкой
+        избранного при каждом запросе и по индексированным колонкам.
+        """
+        users = self.create_users(users_count)
+        recipes = self.create_recipes(users, recipes_count)
+        Favorite.objects.bulk_create(
+            (Favorite(user=user, recipe=recipes[(k + i * 7) % recipes_count])
+             for i, user in enumerate(users) for k in range(per_user)),
+            batch_size=10_000
+        )
+        # Добавления в избранное распределены по окну оценки.
+        now = timezone.now()
+        step = len(users) * per_user // TRENDING_WINDOW_DAYS + 1
+        first_id = Favorite.objects.order_by('id').values_list(
+            'id', flat=True
+        ).first()
+        for day in range(TRENDING_WINDOW_DAYS):
+            Favorite.objects.filter(
+                id__gte=first_id + day * step,
+                id__lt=first_id + (day + 1) * step
+            ).update(created_at=now - timedelta(days=day))
+        call_command('recalculate_counters', stdout=io.StringIO())
+
+        self.measure('update_trending_scores', lambda: call_command(
+            'update_trending_scores', stdout=io.StringIO()
+        ), repeat=3)
+
+        window = Q(favorite__created_at__gte=now - timedelta(
+            days=TRENDING_WINDOW_DAYS
+        ))
+        client = self.get_client(users[0])
+        for name, favorites in (('popular', Count('favorite')),
+                                ('trending', Count('favorite',
+                                                   filter=window))):
+            ordering = RecipeOrderingFilter.orderings[name]
+            self.measure(f'{name}, GROUP BY по избранному', lambda: list(
+                Recipe.objects.annotate(favorites=favorites).order_by(
+                    '-favorites', *ordering[1:]
+                ).values_list('id', flat=True)[:10]
+            ), repeat=5)
+            self.measure(f'{name}, по колонке', lambda: list(
+                Recipe.objects.order_by(*ordering).values_list(
+                    'id', flat=True
+                )[:10]
+            ))
+            self.measure(f'{name}, GET', lambda: client.get(
+                '/api/recipes/', {'ordering': name, 'limit': 10}
+            ))
+
+    def benchmark_feed(self, counts=(10, 1000, 10_000), per_author=5):
+        """
+        Лента подписок читателей, подписанных на counts авторов:
+        одним запросом /feed/ и прежним способом фронтенда -
+        отдельным запросом ?author= для каждого автора.
+        """
+        authors = self.create_users(max(counts), 'author')
+        self.create_recipes(authors, len(authors) * per_author)
+        readers = self.create_users(len(counts), 'reader')
+        Subscription.objects.bulk_create(
+            (Subscription(subscriber=reader, author=author)
+             for reader, count in zip(readers, counts)
+             for author in authors[:count]),
+            batch_size=5000
+        )
+        for reader, count in zip(readers, counts):
+            client = self.get_client(reader)
+            self.measure(f'подписки на {count}, /feed/', lambda: client.get(
+                '/api/recipes/feed/', {'limit': 10}
+            ))
+        timings = self.measure('один запрос ?author=', lambda: client.get(
+            '/api/recipes/', {'author': authors[-1].pk, 'limit': 10}
+        ))
+        for count in counts:
+            self.stdout.write(
+                f'  подписки на {count}, ?author= для каждого: '
+                f'~{count * percentile(timings, 50):.0f} ms'
+            )
+
+    def benchmark_short_link(self, count=10_000):
+        """
+        Переход по короткой ссылке: прежним представлением,
+        первый переход с пустым кэшем и повторные из кэша.
+        """
+        recipes = self.create_recipes(self.create_users(10), count)
+        ShortLink.objects.bulk_create(
+            (ShortLink(recipe=recipe,
+                       code=utils.encode_short_link_code(recipe.pk))
+             for recipe in recipes),
+            batch_size=5000
+        )
+        code = utils.encode_short_link_code(recipes[count // 2].pk)
+        missing_code = utils.encode_short_link_code(recipes[-1].pk + 1)
+        factory = APIRequestFactory()
+        old_view = DatabaseShortLinkView.as_view()
+        view = ShortLinkView.as_view()
+
+        def resolve(view, code, cached=True):
+            if not cached:
+                cache.clear()
+            return view(factory.get(f'/s/{code}/'), code=code)
+
+        self.measure('прежнее представление',
+                     lambda: resolve(old_view, code))
+        self.measure('пустой кэш', lambda: resolve(view, code, False))
+        self.measure('из кэша', lambda: resolve(view, code))
+        self.measure('неизвестный код, прежнее представление',
+                     lambda: resolve(old_view, missing_code), status=404)
+        self.measure('неизвестный код, из кэша',
+                     lambda: resolve(view, missing_code), status=404)
+
+    def benchmark_images(self, size=(2400, 1600), page_size=10):
+        """
+        Создание рецепта с изображением и построение его вариантов
+        обработчиком очереди, затем объем изображений страницы ленты:
+        исходных и уменьшенных копий для карточек.
+        """
+        user = self.create_users(1)[0]
+        ingredient = self.create_ingredients(1)[0]
+        content = make_photo(*size)
+        data = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'image': get_base64_image(content),
+            'ingredients': [{'id': ingredient.pk, 'amount': 1}],
+        }
+        client = self.get_client(user)
+
+        def create_recipe():
+            # Файл изображения и задача обработки записываются
+            # после фиксации транзакции: выполняем их сразу.
+            with TestCase.captureOnCommitCallbacks(execute=True):
+                return client.post('/api/recipes/', data, format='json')
+
+        self.measure(f'POST рецепта, JPEG {size[0]}x{size[1]} '
+                     f'{len(content) // 1024} КБ', create_recipe,
+                     repeat=page_size)
+        name = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).first()
+        self.measure('построение вариантов одного изображения',
+                     lambda: images.build_variants(RECIPE_IMAGE_STORAGE,
+                                                   name),
+                     repeat=5)
+        # Очередь обрабатывается в этом же соединении: потоки
+        # обработчика не видят данных неподтвержденной транзакции.
+        start = time.perf_counter()
+        processed = 0
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            while (task := images.claim_task()) is not None:
+                images.process_task(task)
+                processed += 1
+        self.stdout.write(
+            f'  обработка очереди: {processed} изображений за '
+            f'{time.perf_counter() - start:.2f} s'
+        )
+
+        response = self.measure('лента', lambda: client.get(
+            '/api/recipes/', {'limit': page_size}
+        ))
+        response = client.get('/api/recipes/', {'limit': page_size})
+        rows = Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in response.data['results']]
+        ).values_list('image', 'image_variants')
+        sizes = {'исходные': 0}
+        for image, variants in rows:
+            sizes['исходные'] += RECIPE_IMAGE_STORAGE.size(image)
+            for variant, variant_name in variants.items():
+                sizes[variant] = (sizes.get(variant, 0)
+                                  + RECIPE_IMAGE_STORAGE.size(variant_name))
+        for variant, total in sizes.items():
+            self.stdout.write(f'  изображения страницы ({len(rows)}), '
+                              f'{variant}: {total // 1024} КБ')
+
+    def benchmark_upload(self, size=(4800, 3200)):
+        """
+        Пик памяти при загрузке изображения: прежним полем
+        Base64ImageField и потоковым полем, а также целиком запросом
+        смены аватара прежним представлением и текущим в base64
+        и в multipart.
+        """
+        user = self.create_users(1)[0]
+        content = make_photo(*size)
+        image = get_base64_image(content)
+        self.stdout.write(f'  JPEG {size[0]}x{size[1]}: '
+                          f'{len(content) / 2**20:.1f} MB, '
+                          f'base64 {len(image) / 2**20:.1f} MB')
+
+        def stream(image):
+            StreamingImageField().to_internal_value(image).close()
+
+        self.measure_memory('Base64ImageField',
+                            lambda: Base64ImageField().to_internal_value(
+                                image
+                            ))
+        self.measure_memory('StreamingImageField', lambda: stream(image))
+
+        json_body = (json.dumps({'avatar': image}).encode(),
+                     'application/json')
+        multipart_body = (
+            encode_multipart('BoUnDaRy', {
+                'avatar': SimpleUploadedFile('avatar.jpg', content,
+                                             'image/jpeg')
+            }),
+            'multipart/form-data; boundary=BoUnDaRy'
+        )
+        factory = APIRequestFactory()
+
+        def put(view, request):
+            try:
+                with TestCase.captureOnCommitCallbacks(execute=True):
+                    return view(request)
+            finally:
+                # Как обработчик запросов: закрывает загруженные файлы.
+                request.close()
+
+        for label, view, (body, content_type) in (
+            ('прежний PUT аватара, json base64', Base64AvatarView,
+             json_body),
+            ('PUT аватара, json base64', UserAvatarView, json_body),
+            ('PUT аватара, multipart', UserAvatarView, multipart_body),
+        ):
+            view = view.as_view()
+            # Запросы с копиями тела созданы заранее
+            # и не входят в замер.
+            requests = []
+            for _ in range(20):
+                request = factory.put('/api/users/me/avatar/', body,
+                                      content_type=content_type)
+                force_authenticate(request, user)
+                requests.append(request)
+            requests = iter(requests)
+            self.measure_memory(label, lambda: put(view, next(requests)))
+            self.measure(label, lambda: put(view, next(requests)),
+                         repeat=10)
+
+    def benchmark_conditional(self, trace_length=2000, update_every=50):
+        """
+        Повтор записанной последовательности запросов клиентов, которые
+        перечитывают одни и те же рецепты, ленту, авторов и справочник,
+        без условных заголовков и с If-None-Match по сохраненным ETag.
+        Каждые update_every запросов один из рецептов изменяется.
+        """
+        users = self.create_users(20)
+        recipes = self.create_recipes(users, 200)
+        self.create_ingredients(200, 5, recipes)
+        clients = [self.get_client(user) for user in users[:5]]
+
+        # Популярные рецепты запрашиваются чаще остальных.
+        generator = random.Random(0)
+        trace = []
+        for _ in range(trace_length):
+            value = generator.random()
+            if value < 0.6:
+                recipe = recipes[int(len(recipes) * generator.random() ** 3)]
+                url = f'/api/recipes/{recipe.pk}/'
+            elif value < 0.8:
+                url = '/api/recipes/?limit=6'
+            elif value < 0.9:
+                url = f'/api/users/{generator.choice(users).pk}/'
+            else:
+                url = '/api/ingredients/'
+            trace.append((generator.choice(clients), url))
+        updates = [generator.choice(recipes[:20])
+                   for _ in range(trace_length // update_every)]
+
+        for conditional in (False, True):
+            etags = {}
+            sent = not_modified = 0
+            start, start_cpu = time.perf_counter(), time.process_time()
+            for number, (client, url) in enumerate(trace):
+                if number % update_every == 0:
+                    recipe = updates[number // update_every]
+                    recipe.name = f'Рецепт {number}'
+                    with TestCase.captureOnCommitCallbacks(execute=True):
+                        recipe.save()
+                headers = {}
+                if conditional and (client, url) in etags:
+                    headers['HTTP_IF_NONE_MATCH'] = etags[client, url]
+                response = client.get(url, **headers)
+                if response.status_code == 304:
+                    not_modified += 1
+                elif response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: ответ с кодом {response.status_code}.'
+                    )
+                etags[client, url] = response['ETag']
+                sent += len(response.content)
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - start_cpu
+            label = 'с If-None-Match' if conditional else 'без условий'
+            self.stdout.write(
+                f'  {label:<44} {elapsed:6.2f} s  CPU {cpu:6.2f} s  '
+                f'{sent / 2**20:6.2f} MB  304: {not_modified}'
+            )
+
+    def benchmark_response_cache(self, limit=6):
+        """
+        Анонимные запросы ленты и рецепта: с очисткой кэша перед каждым
+        запросом (полная сериализация и запись в кэш) и из кэша ответов,
+        с кэшем в памяти процесса и файловым.
+        """
+        users = self.create_users(20)
+        recipes = self.create_recipes(users, 200)
+        self.create_ingredients(200, 5, recipes)
+        client = self.get_client()
+        urls = {
+            'лента': f'/api/recipes/?limit={limit}',
+            'рецепт': f'/api/recipes/{recipes[0].pk}/',
+        }
+
+        def get(url, cached):
+            if not cached:
+                cache.clear()
+            return client.get(url)
+
+        with tempfile.TemporaryDirectory() as location:
+            for backend, options in (
+                ('память', {
+                    'BACKEND':
+                        'django.core.cache.backends.locmem.LocMemCache',
+                }),
+                ('файлы', {
+                    'BACKEND':
+                        'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': location,
+                }),
+            ):
+                with override_settings(CACHES={'default': {
+                    **options, 'OPTIONS': {'MAX_ENTRIES': 100_000}
+                }}):
+                    for name, url in urls.items():
+                        self.measure(f'{name}, промах, {backend}',
+                                     lambda: get(url, False))
+                        self.measure(f'{name}, из кэша, {backend}',
+                                     lambda: get(url, True))
+
+    def benchmark_serialization(self, limit=50, subscriptions=10):
+        """
+        Ответы частых списков на чтение: сериализаторами DRF
+        с JSONRenderer и из строк values_list с FastJSONRenderer.
+        Оба ответа должны совпадать побайтно.
+        """
+        authors = self.create_users(60)
+        reader = authors[0]
+        recipes = self.create_recipes(authors, 1000)
+        self.create_ingredients(2200, 10, recipes)
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=reader, author=author)
+            for author in authors[1:subscriptions + 1]
+        )
+        call_command('recalculate_counters', stdout=io.StringIO())
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = reader
+
+        recipes = Recipe.objects.with_user_flags(reader).order_by(
+            '-pub_date', '-id'
+        )
+        users = User.objects.filter(
+            subscribers__subscriber=reader
+        ).with_is_subscribed(reader).order_by('id')
+        endpoints = {
+            f'рецепты, {limit}': (
+                lambda: RecipeReadSerializer(
+                    recipes.with_related(reader)[:limit], many=True,
+                    context={'request': request}
+                ).data,
+                lambda: get_recipes(list(
+                    recipes.with_versions(reader).values_list(
+                        *RECIPE_COLUMNS, named=True
+                    )[:limit]
+                ), request),
+            ),
+            f'подписки, {subscriptions}': (
+                lambda: UserWithRecipesSerializer(
+                    users.prefetch_related('recipes'), many=True,
+                    context={'request': request}
+                ).data,
+                lambda: get_subscriptions(list(users.values_list(
+                    *USER_WITH_RECIPES_COLUMNS, named=True
+                )), request),
+            ),
+            'ингредиенты, 2200': (
+                lambda: IngredientSerializer(
+                    Ingredient.objects.all(), many=True
+                ).data,
+                lambda: [ingredient_to_dict(row, None) for row in
+                         Ingredient.objects.values_list(
+                             *INGREDIENT_COLUMNS
+                         )],
+            ),
+        }
+        for label, (get_drf_data, get_data) in endpoints.items():
+            drf_data, data = get_drf_data(), get_data()
+            if (JSONRenderer().render(drf_data)
+                    != FastJSONRenderer().render(data)):
+                raise CommandError(f'{label}: ответы различаются.')
+            self.measure(f'{label}, DRF', lambda: JSONRenderer().render(
+                get_drf_data()
+            ))
+            self.measure(f'{label}, строки', lambda: FastJSONRenderer(
+            ).render(get_data()))
+            self.measure(f'{label}, только JSONRenderer',
+                         lambda: JSONRenderer().render(drf_data))
+            self.measure(f'{label}, только FastJSONRenderer',
+                         lambda: FastJSONRenderer().render(data))
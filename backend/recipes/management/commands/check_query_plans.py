@@ -0,0 +1,85 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+# Признаки полного просмотра таблицы в выводе EXPLAIN.
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+
+def get_hot_queries(user_id=0, recipe_id=0):
+    """
+    Запросы, выполняемые на каждой странице ленты, фильтрах
+    и переключателях избранного, списка покупок и подписок.
+    """
+    recipes = Recipe.objects.order_by('-pub_date', '-id')
+    return {
+        'лента рецептов': recipes[:10],
+        'рецепты автора': recipes.filter(author_id=user_id)[:10],
+        'лента подписок': recipes.filter(
+            author__in=Subscription.objects.filter(
+                subscriber_id=user_id
+            ).values('author')
+        )[:10],
+        'фильтр is_favorited': recipes.filter(favorite__user_id=user_id)[:10],
+        'фильтр is_in_shopping_cart': recipes.filter(
+            shoppingcart__user_id=user_id
+        )[:10],
+        'рецепт в избранном': Favorite.objects.filter(
+            user_id=user_id, recipe_id=recipe_id
+        ),
+        'рецепт в списке покупок': ShoppingCart.objects.filter(
+            user_id=user_id, recipe_id=recipe_id
+        ),
+        'подписка на автора': Subscription.objects.filter(
+            author_id=user_id, subscriber_id=user_id
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Проверяет по EXPLAIN, что частые запросы ленты, фильтров '
+            'и переключателей используют индексы, а не полный '
+            'просмотр таблиц. Завершается ошибкой, если это не так.')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'Проверка планов для {connection.vendor} не поддерживается.'
+            )
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # На небольших таблицах планировщик выбирает полный
+                # просмотр даже при наличии индекса: запрещаем его,
+                # чтобы в плане остался Seq Scan только там,
+                # где подходящего индекса нет.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset in get_hot_queries().items():
+                plan = queryset.explain()
+                tables = sorted(set(pattern.findall(plan)))
+                if tables:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: полный просмотр {", ".join(tables)}'
+                    ))
+                    self.stdout.write(plan)
+                else:
+                    self.stdout.write(f'{name}: OK')
+
+        if failures:
+            raise CommandError(
+                f'Запросы без подходящих индексов: {", ".join(failures)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Все частые запросы используют индексы.'
+        ))
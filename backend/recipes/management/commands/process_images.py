@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from foodgram_back.constants import IMAGE_WORKER_POLL_INTERVAL
+from recipes.images import claim_task, process_task
+from recipes.models import ImageTask, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает очередь изображений рецептов: строит уменьшенные '
+            'копии и варианты в формате WebP пулом потоков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Количество потоков обработки.')
+        parser.add_argument('--once', action='store_true',
+                            help='Завершиться, когда очередь опустеет.')
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help='Поставить в очередь изображения рецептов '
+                                 'без вариантов.')
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            recipes = Recipe.objects.exclude(image='').exclude(
+                image__isnull=True
+            ).filter(image_variants={}, image_tasks__isnull=True)
+            created = ImageTask.objects.bulk_create(
+                ImageTask(recipe_id=pk, image=image)
+                for pk, image in recipes.values_list('id', 'image')
+            )
+            self.stdout.write(f'Поставлено в очередь: {len(created)}.')
+
+        self.processed = 0
+        self.lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            workers = [executor.submit(self.work, options['once'])
+                       for _ in range(options['workers'])]
+            for worker in workers:
+                worker.result()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано задач: {self.processed}.'
+        ))
+
+    def work(self, once):
+        try:
+            while True:
+                task = claim_task()
+                if task is None:
+                    if once:
+                        return
+                    time.sleep(IMAGE_WORKER_POLL_INTERVAL)
+                    continue
+                process_task(task)
+                with self.lock:
+                    self.processed += 1
+        finally:
+            # У каждого потока свое соединение с базой.
+            connection.close()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.utils import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = ('Заново собирает сводные списки покупок пользователей '
+            'из рецептов в их списках покупок.')
+
+    def handle(self, *args, **options):
+        created = rebuild_shopping_lists()
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: строк - {created}.'
+        ))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.utils import count_subquery
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, списков покупок, '
+            'рецептов и подписчиков по фактическим данным.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_subquery(Favorite.objects, 'recipe'),
+            cart_count=count_subquery(ShoppingCart.objects, 'recipe'),
+        )
+        users = User.objects.update(
+            recipes_count=count_subquery(Recipe.objects, 'author'),
+            subscribers_count=count_subquery(Subscription.objects, 'author'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны: рецептов - {recipes}, '
+            f'пользователей - {users}.'
+        ))
@@ -0,0 +1,71 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from foodgram_back.constants import (TRENDING_HALF_LIFE_DAYS,
+                                     TRENDING_UPDATE_INTERVAL,
+                                     TRENDING_WINDOW_DAYS)
+from recipes.models import Favorite, Recipe
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает затухающую оценку популярности рецептов '
+            'по добавлениям в избранное. Запускается периодически: '
+            'по cron или с --loop.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Пересчитывать оценку в цикле.')
+        parser.add_argument('--interval', type=int,
+                            default=TRENDING_UPDATE_INTERVAL,
+                            help='Пауза между пересчетами в цикле '
+                                 '(в секундах).')
+
+    def handle(self, *args, **options):
+        self.update_scores()
+        while options['loop']:
+            # Соединение не держится открытым во время паузы.
+            connection.close()
+            time.sleep(options['interval'])
+            self.update_scores()
+
+    def update_scores(self):
+        now = timezone.now()
+        # Избранное группируется по рецептам и дням, поэтому объем
+        # вычислений зависит от числа рецептов и длины окна,
+        # а не от общего количества записей.
+        buckets = Favorite.objects.filter(
+            created_at__gte=now - timedelta(days=TRENDING_WINDOW_DAYS)
+        ).annotate(
+            day=TruncDay('created_at')
+        ).values('recipe_id', 'day').annotate(
+            count=Count('id')
+        ).order_by()
+
+        scores = defaultdict(float)
+        for bucket in buckets:
+            age_days = (now - bucket['day']).total_seconds() / 86400
+            scores[bucket['recipe_id']] += (
+                bucket['count'] * 0.5 ** (age_days / TRENDING_HALF_LIFE_DAYS)
+            )
+
+        with transaction.atomic():
+            Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+            Recipe.objects.bulk_update(
+                [Recipe(pk=pk, trending_score=score)
+                 for pk, score in scores.items()],
+                ('trending_score',),
+                batch_size=BATCH_SIZE
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Оценка популярности обновлена для {len(scores)} рецептов.'
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 03:56
+
+from django.db import migrations
+
+# Индексы по LOWER(name) для поиска ингредиентов создаются только
+# на PostgreSQL, на SQLite поиск выполняется без них.
+INDEXES = (
+    ('recipes_ingredient_name_lower_prefix_idx',
+     'btree (LOWER(name) text_pattern_ops)'),
+    ('recipes_ingredient_name_lower_trgm_idx',
+     'gin (LOWER(name) gin_trgm_ops)'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Расширение для триграммного индекса. Операция TrigramExtension
+    # не используется: ее модуль требует psycopg даже на SQLite.
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, definition in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} '
+            f'ON recipes_ingredient USING {definition}'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 04:07
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Удаляет повторные записи избранного и списка покупок,
+    оставляя самую раннюю, чтобы можно было создать ограничение.
+    """
+    for model_name in ('Favorite', 'ShoppingCart'):
+        model = apps.get_model('recipes', model_name)
+        first_ids = model.objects.values('user', 'recipe').annotate(
+            first_id=Min('id')
+        ).values('first_id')
+        model.objects.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_author_pub_date_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='favorite_unique_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='shoppingcart_unique_user_recipe'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-17 04:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """
+    Собирает списки покупок из уже добавленных в них рецептов.
+    """
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    rows = ShoppingCart.objects.filter(
+        recipe__ingredients__isnull=False
+    ).order_by().values(
+        'user', ingredient=F('recipe__ingredients__ingredient')
+    ).annotate(total_amount=Sum('recipe__ingredients__amount'))
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(user_id=row['user'],
+                         ingredient_id=row['ingredient'],
+                         amount=row['total_amount'])
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipeuser_unique_user_recipe'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Строки списков покупок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient_in_shopping_list')],
+            },
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
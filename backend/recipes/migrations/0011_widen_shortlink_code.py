@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shortlink',
+            name='code',
+            field=models.CharField(max_length=11, unique=True),
+        ),
+    ]
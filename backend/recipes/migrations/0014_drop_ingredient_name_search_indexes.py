@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 09:40
+
+from importlib import import_module
+
+from django.db import migrations
+
+# Поиск ингредиентов выполняется по снимку справочника в памяти
+# (recipes/catalog.py), индексы по LOWER(name) им не используются
+# и только замедляют запись в таблицу ингредиентов.
+search_indexes = import_module(
+    'recipes.migrations.0005_ingredient_name_search_indexes'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            search_indexes.drop_indexes, search_indexes.create_indexes
+        ),
+    ]
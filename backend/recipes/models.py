@@ -1,14 +1,79 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
 
 from foodgram_back.constants import (RECIPE_INGREDIENT_NAME_MAX_LENGTH,
                                      SHORT_LINK_CODE_MAX_LENGTH,
                                      MEASUREMENT_UNIT_MAX_LENGTH)
+from users.models import CounterFieldsMixin, Subscription
 
 User = get_user_model()
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """
+    Набор запросов для рецептов с оптимизацией чтения.
+    """
+
+    @staticmethod
+    def get_related_lookups(user):
+        """
+        Подгрузка авторов (с признаком подписки на них пользователя)
+        и ингредиентов рецептов для чтения.
+        """
+        return (
+            Prefetch('author', queryset=User.objects.with_is_subscribed(user)),
+            Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
+
+    def with_related(self, user):
+        """
+        Подгружает авторов и ингредиенты рецептов фиксированным
+        количеством запросов вместо запроса на каждый рецепт.
+        """
+        return self.prefetch_related(*self.get_related_lookups(user))
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует рецепты признаками нахождения
+        в избранном и списке покупок пользователя.
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_favorited=Value(False),
+                                 is_in_shopping_cart=Value(False))
+
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                recipe=OuterRef('pk'), user=user
+            ))
+        )
+
+    def with_versions(self, user):
+        """
+        Аннотирует рецепты временем изменения автора и признаком
+        подписки на него пользователя. Вместе с updated_at
+        и with_user_flags это все, от чего зависит представление
+        рецепта, без загрузки авторов и ингредиентов.
+        """
+        if not user.is_authenticated:
+            author_is_subscribed = Value(False)
+        else:
+            author_is_subscribed = Exists(Subscription.objects.filter(
+                author=OuterRef('author'), subscriber=user
+            ))
+        return self.annotate(author_updated_at=F('author__updated_at'),
+                             author_is_subscribed=author_is_subscribed)
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """
     Модель для рецепта.
     """
@@ -26,13 +91,54 @@ class Recipe(models.Model):
     image = models.ImageField(verbose_name='Изображение',
                               blank=True, null=True)
 
+    # Варианты изображения (название -> имя файла в хранилище),
+    # заполняются обработчиком очереди ImageTask.
+    image_variants = models.JSONField(verbose_name='Варианты изображения',
+                                      default=dict, blank=True,
+                                      editable=False)
+
     pub_date = models.DateTimeField(verbose_name='Дата публикации',
                                     auto_now_add=True)
+    # Время изменения для ETag и Last-Modified: обновляется при save()
+    # и при изменении вариантов изображения, но не счетчиков.
+    updated_at = models.DateTimeField(verbose_name='Дата изменения',
+                                      auto_now=True)
+
+    # Счетчики поддерживаются сигналами (см. recipes.signals),
+    # пересчитываются командой recalculate_counters.
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном (количество)', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок (количество)', default=0,
+        editable=False
+    )
+    # Затухающая со временем оценка популярности,
+    # обновляется командой update_trending_scores.
+    trending_score = models.FloatField(verbose_name='Оценка популярности',
+                                       default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'cart_count', 'trending_score')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            # Индекс для курсорной пагинации ленты рецептов.
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            # Индекс для ленты рецептов авторов из подписок.
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            # Индексы для сортировки ленты по популярности.
+            models.Index(fields=['-favorites_count', '-pub_date', '-id'],
+                         name='recipe_popular_idx'),
+            models.Index(fields=['-trending_score', '-pub_date', '-id'],
+                         name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -57,10 +163,12 @@ class RecipeUser(models.Model):
 
     class Meta:
         abstract = True
+        # Уникальный индекс начинается с user: фильтры is_favorited и
+        # is_in_shopping_cart выбирают записи по пользователю.
         constraints = [
             models.UniqueConstraint(
-                fields=['recipe', 'user'],
-                name='%(class)s_unique_recipe_user'
+                fields=['user', 'recipe'],
+                name='%(class)s_unique_user_recipe'
             )
         ]
 
@@ -72,7 +180,13 @@ class Favorite(RecipeUser):
     """
     Модель для избранного.
     """
-    class Meta:
+    # Счетчик рецепта, отражающий количество записей модели.
+    recipe_counter_field = 'favorites_count'
+
+    created_at = models.DateTimeField(verbose_name='Дата добавления',
+                                      auto_now_add=True, db_index=True)
+
+    class Meta(RecipeUser.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -81,7 +195,9 @@ class ShoppingCart(RecipeUser):
     """
     Модель для списка покупок.
     """
-    class Meta:
+    recipe_counter_field = 'cart_count'
+
+    class Meta(RecipeUser.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
@@ -140,6 +256,67 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient.name} для {self.recipe.name}'
 
 
+class ShoppingListItem(models.Model):
+    """
+    Модель для строки списка покупок: суммарное количество ингредиента
+    по всем рецептам в списке покупок пользователя. Поддерживается
+    при изменении списка покупок и ингредиентов рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_in_shopping_list'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient.name} у {self.user.username}'
+
+
+class ImageTask(models.Model):
+    """
+    Модель для задачи очереди на построение вариантов изображения
+    рецепта. Обрабатывается командой process_images.
+    """
+    recipe = models.ForeignKey(Recipe,
+                               verbose_name='Рецепт',
+                               on_delete=models.CASCADE,
+                               related_name='image_tasks')
+    # Имя исходного файла: если изображение рецепта
+    # успело смениться, задача пропускается.
+    image = models.CharField(verbose_name='Изображение', max_length=255)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Попытки',
+                                                default=0)
+    locked_until = models.DateTimeField(verbose_name='Занята до',
+                                        null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name='Дата создания',
+                                      auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Обработка изображения'
+        verbose_name_plural = 'Обработка изображений'
+        ordering = ['id']
+
+    def __str__(self):
+        return self.image
+
+
 class ShortLink(models.Model):
     """
     Модель для хранения сокращенных ссылок.
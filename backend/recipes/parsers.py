@@ -0,0 +1,43 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
+
+from foodgram_back.constants import IMAGE_UPLOAD_MAX_REQUEST_SIZE
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'payload_too_large'
+
+
+class ContentLengthLimitMixin:
+    """
+    Миксин для парсеров: отклоняет запрос по заголовку Content-Length,
+    не читая тело запроса.
+    """
+    max_content_length = IMAGE_UPLOAD_MAX_REQUEST_SIZE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > self.max_content_length:
+            raise PayloadTooLarge(
+                f'Размер запроса больше {self.max_content_length} байт.'
+            )
+        return super().parse(stream, media_type, parser_context)
+
+
+class ImageUploadJSONParser(ContentLengthLimitMixin, JSONParser):
+    pass
+
+
+class ImageUploadMultiPartParser(ContentLengthLimitMixin, MultiPartParser):
+    pass
+
+
+# Парсеры для запросов с изображением в base64 или в multipart.
+IMAGE_UPLOAD_PARSERS = (ImageUploadJSONParser, ImageUploadMultiPartParser)
@@ -0,0 +1,133 @@
+import csv
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from foodgram_back.constants import SHOPPING_LIST_CHUNK_SIZE
+from . import utils
+
+
+class EchoBuffer:
+    """
+    Псевдобуфер, возвращающий записанное значение,
+    чтобы csv.writer формировал строки без накопления в памяти.
+    """
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+    Наследники реализуют генератор stream, который
+    по частям отдает документ для потокового ответа.
+    """
+    charset = 'utf-8'
+
+    def stream(self, ingredients_data):
+        raise NotImplementedError('.stream() must be implemented')
+
+    def prepared_stream(self, ingredients_data):
+        """
+        Генератор stream с уже построенным первым фрагментом: ошибки
+        подготовки документа (например, загрузки шрифта pdf) возникают
+        до отправки статуса и заголовков, а не обрывают файл.
+        """
+        stream = self.stream(ingredients_data)
+        first_chunk = next(stream, None)
+
+        def chunks():
+            if first_chunk is None:
+                return
+            try:
+                yield first_chunk
+                yield from stream
+            finally:
+                stream.close()
+
+        return chunks()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.stream(data))
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """
+    Рендерер списка покупок в формате pdf.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, ingredients_data):
+        with utils.get_shopping_list_pdf_file(ingredients_data) as file:
+            while chunk := file.read(SHOPPING_LIST_CHUNK_SIZE):
+                yield chunk
+
+
+class ShoppingListTXTRenderer(ShoppingListRenderer):
+    """
+    Рендерер списка покупок в виде простого текста.
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients_data):
+        yield 'Список покупок\n\n'.encode(self.charset)
+        for ingredient_data in ingredients_data:
+            yield (utils.format_shopping_list_item(ingredient_data)
+                   + '\n').encode(self.charset)
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """
+    Рендерер списка покупок в формате csv.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients_data):
+        writer = csv.writer(EchoBuffer())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        ).encode(self.charset)
+        for ingredient_data in ingredients_data:
+            yield writer.writerow((
+                ingredient_data['ingredient__name'],
+                ingredient_data['ingredient__measurement_unit'],
+                ingredient_data['total_amount']
+            )).encode(self.charset)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Рендерер json на orjson для частых ответов на чтение.
+    Результат побайтно совпадает с JSONRenderer: компактный вывод
+    без экранирования не-ASCII символов, даты и прочие нестандартные
+    типы передаются кодировщику DRF. Для отступов, других настроек
+    и неподдерживаемых orjson данных используется JSONRenderer.
+    Числа с плавающей точкой orjson записывает иначе, поэтому
+    рендерер подключается только к ответам без них.
+    """
+    options = (orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS
+               | orjson.OPT_NON_STR_KEYS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        # Как и JSONRenderer, экранируем \u2028 и \u2029.
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
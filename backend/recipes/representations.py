@@ -0,0 +1,202 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from foodgram_back.constants import RECIPE_IMAGE_VARIANTS
+from users.serializers import (ShortRecipeSerializer,
+                               UserSerializer,
+                               UserWithRecipesSerializer)
+from .models import Recipe, RecipeIngredient
+from .serializers import (IngredientSerializer,
+                          RecipeIngredientReadSerializer,
+                          RecipeReadSerializer)
+
+User = get_user_model()
+
+RECIPE_IMAGE_STORAGE = Recipe._meta.get_field('image').storage
+AVATAR_STORAGE = User._meta.get_field('avatar').storage
+
+
+def compile_representation(serializer_class, columns, sources=None):
+    """
+    Компилирует функцию to_representation(row, context), которая строит
+    из строки values_list(*columns) такой же словарь, как
+    serializer_class, с теми же полями в том же порядке.
+
+    Значение поля берется из столбца с именем поля или с именем
+    sources[поле], либо вычисляется функцией sources[поле](row,
+    context) - тогда строка должна быть получена с named=True.
+    """
+    sources = sources or {}
+    namespace = {}
+    items = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        source = sources.get(name, name)
+        if callable(source):
+            namespace[f'get_{name}'] = source
+            value = f'get_{name}(row, context)'
+        else:
+            value = f'row[{columns.index(source)}]'
+        items.append(f'{name!r}: {value}')
+    exec(
+        'def to_representation(row, context):\n'
+        f'    return {{{", ".join(items)}}}\n',
+        namespace
+    )
+    return namespace['to_representation']
+
+
+class RepresentationContext:
+    """
+    Общие для строк ответа данные: запрос для абсолютных ссылок
+    на файлы и подгруженные одним запросом связанные объекты.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.authors = {}
+        self.ingredients = defaultdict(list)
+        self.recipes = defaultdict(list)
+
+    def get_url(self, url):
+        if self.request is None:
+            return url
+        return self.request.build_absolute_uri(url)
+
+    def get_file_url(self, storage, name):
+        # Как ImageField.to_representation.
+        if not name:
+            return None
+        return self.get_url(storage.url(name))
+
+    def get_image_variants(self, name, variants):
+        # Как ImageVariantsField.to_representation.
+        if not name:
+            return None
+        return {
+            variant: self.get_url(RECIPE_IMAGE_STORAGE.url(
+                variants.get(variant) or name
+            ))
+            for variant in RECIPE_IMAGE_VARIANTS
+        }
+
+
+def get_image(row, context):
+    return context.get_file_url(RECIPE_IMAGE_STORAGE, row.image)
+
+
+def get_image_variants(row, context):
+    return context.get_image_variants(row.image, row.image_variants)
+
+
+def get_avatar(row, context):
+    return context.get_file_url(AVATAR_STORAGE, row.avatar)
+
+
+USER_COLUMNS = ('id', 'email', 'username', 'first_name', 'last_name',
+                'is_subscribed', 'avatar')
+user_to_dict = compile_representation(UserSerializer, USER_COLUMNS, {
+    'avatar': get_avatar,
+})
+
+INGREDIENT_COLUMNS = ('id', 'name', 'measurement_unit')
+ingredient_to_dict = compile_representation(IngredientSerializer,
+                                            INGREDIENT_COLUMNS)
+
+RECIPE_INGREDIENT_COLUMNS = ('recipe_id', 'ingredient_id',
+                             'ingredient__name',
+                             'ingredient__measurement_unit', 'amount')
+recipe_ingredient_to_dict = compile_representation(
+    RecipeIngredientReadSerializer, RECIPE_INGREDIENT_COLUMNS, {
+        'id': 'ingredient_id',
+        'name': 'ingredient__name',
+        'measurement_unit': 'ingredient__measurement_unit',
+    }
+)
+
+# Кроме полей ответа, строки рецептов содержат столбцы версий
+# для ETag (см. RecipeQuerySet.with_versions) и столбцы
+# сортировок ленты для курсорной пагинации.
+RECIPE_COLUMNS = ('id', 'author_id', 'name', 'text', 'cooking_time',
+                  'image', 'image_variants', 'is_favorited',
+                  'is_in_shopping_cart', 'updated_at', 'author_updated_at',
+                  'author_is_subscribed', 'pub_date', 'favorites_count',
+                  'trending_score')
+recipe_to_dict = compile_representation(RecipeReadSerializer, RECIPE_COLUMNS, {
+    'author': lambda row, context: context.authors[row.author_id],
+    'image': get_image,
+    'image_variants': get_image_variants,
+    'ingredients': lambda row, context: context.ingredients[row.id],
+})
+
+SHORT_RECIPE_COLUMNS = ('author_id', 'id', 'name', 'image',
+                        'image_variants', 'cooking_time')
+short_recipe_to_dict = compile_representation(
+    ShortRecipeSerializer, SHORT_RECIPE_COLUMNS, {
+        'image': get_image,
+        'image_variants': get_image_variants,
+    }
+)
+
+USER_WITH_RECIPES_COLUMNS = USER_COLUMNS + ('recipes_count',)
+user_with_recipes_to_dict = compile_representation(
+    UserWithRecipesSerializer, USER_WITH_RECIPES_COLUMNS, {
+        'avatar': get_avatar,
+        'recipes': lambda row, context: context.recipes[row.id],
+    }
+)
+
+
+def get_recipes(rows, request):
+    """
+    Представления рецептов по строкам values_list(*RECIPE_COLUMNS,
+    named=True), совпадающие с RecipeReadSerializer. Авторы
+    и ингредиенты загружаются двумя запросами на все строки.
+    """
+    context = RepresentationContext(request)
+    authors = User.objects.filter(
+        id__in={row.author_id for row in rows}
+    ).with_is_subscribed(request.user)
+    for row in authors.values_list(*USER_COLUMNS, named=True):
+        context.authors[row.id] = user_to_dict(row, context)
+
+    ingredients = RecipeIngredient.objects.filter(
+        recipe_id__in=[row.id for row in rows]
+    ).order_by('id')
+    for row in ingredients.values_list(*RECIPE_INGREDIENT_COLUMNS):
+        context.ingredients[row[0]].append(
+            recipe_ingredient_to_dict(row, context)
+        )
+
+    return [recipe_to_dict(row, context) for row in rows]
+
+
+def get_subscriptions(rows, request, recipes_limit=None):
+    """
+    Представления авторов из подписок по строкам
+    values_list(*USER_WITH_RECIPES_COLUMNS, named=True), совпадающие
+    с UserWithRecipesSerializer. Рецепты, не более recipes_limit
+    у каждого автора, загружаются одним запросом.
+    """
+    context = RepresentationContext(request)
+    recipes = Recipe.objects.filter(author_id__in=[row.id for row in rows])
+    if recipes_limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            RowNumber(), partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc())
+        )).filter(row_number__lte=recipes_limit)
+    # UserWithRecipesSerializer сериализует рецепты без запроса
+    # в контексте, поэтому ссылки на изображения - относительные.
+    recipes_context = RepresentationContext()
+    for row in recipes.order_by('-pub_date', '-id').values_list(
+        *SHORT_RECIPE_COLUMNS, named=True
+    ):
+        context.recipes[row.author_id].append(
+            short_recipe_to_dict(row, recipes_context)
+        )
+
+    return [user_with_recipes_to_dict(row, context) for row in rows]
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import Counter
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_vary_headers)
+from django.utils.http import parse_http_date_safe
+
+from foodgram_back.constants import (RECIPE_RESPONSE_CACHE_TIMEOUT,
+                                     RESPONSE_CACHE_STATS_FLUSH_INTERVAL)
+from .catalog import CATALOG_VERSION_CACHE_KEY
+
+# Версия всех списков рецептов: меняется при изменении любого рецепта.
+RECIPE_LIST_VERSION_CACHE_KEY = 'recipe_list_version'
+RESPONSE_CACHE_HITS_KEY = 'recipe_response_cache_hits'
+RESPONSE_CACHE_MISSES_KEY = 'recipe_response_cache_misses'
+# Заголовки, сохраняемые в кэше вместе с телом ответа.
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def get_recipe_version_cache_key(recipe_id):
+    return f'recipe_version:{recipe_id}'
+
+
+def get_versions(keys):
+    """
+    Возвращает текущие версии по ключам кэша. Отсутствующая
+    версия заменяется новой, поэтому вытеснение ключа версии
+    из кэша только сбрасывает зависящие от нее ответы.
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_recipe_responses(recipe_ids):
+    """
+    Помечает устаревшими закэшированные ответы с рецептами recipe_ids
+    и все списки рецептов.
+    """
+    version = time.time_ns()
+    cache.set_many(
+        {key: version for key in (
+            RECIPE_LIST_VERSION_CACHE_KEY,
+            *map(get_recipe_version_cache_key, recipe_ids)
+        )},
+        None
+    )
+
+
+class StatsCounter:
+    """
+    Счетчики попаданий в кэш ответов и промахов. Считаются в памяти
+    процесса и переносятся в общий кэш не чаще, чем раз
+    в RESPONSE_CACHE_STATS_FLUSH_INTERVAL секунд: запись в файловый
+    кэш на каждый запрос замедлила бы сами ответы из кэша.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+            if (time.monotonic() - self.flushed_at
+                    < RESPONSE_CACHE_STATS_FLUSH_INTERVAL):
+                return
+            counts, self.counts = self.counts, Counter()
+            self.flushed_at = time.monotonic()
+        self.flush(counts)
+
+    def flush(self, counts=None):
+        if counts is None:
+            with self.lock:
+                counts, self.counts = self.counts, Counter()
+                self.flushed_at = time.monotonic()
+        for key, value in counts.items():
+            # incr файлового кэша не атомарен, но при редком переносе
+            # одновременные изменения разными процессами маловероятны.
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+stats_counter = StatsCounter()
+
+
+def get_stats():
+    """
+    Количество попаданий в кэш ответов и промахов
+    с момента последнего сброса кэша. Счетчики других процессов
+    учитываются с задержкой до RESPONSE_CACHE_STATS_FLUSH_INTERVAL.
+    """
+    stats_counter.flush()
+    stats = cache.get_many((RESPONSE_CACHE_HITS_KEY,
+                            RESPONSE_CACHE_MISSES_KEY))
+    hits = stats.get(RESPONSE_CACHE_HITS_KEY, 0)
+    misses = stats.get(RESPONSE_CACHE_MISSES_KEY, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 4) if hits else 0.0,
+    }
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Миксин для представлений, кэширующих готовые ответы анонимным
+    пользователям: для них признаки избранного, списка покупок
+    и подписок всегда ложны, и ответ одинаков для всех.
+    Ключ строится по версиям кэша, от которых зависит ответ,
+    адресу сервера и нормализованным параметрам запроса.
+    """
+
+    def get_response_cache_key(self, version_keys, *parts):
+        request = self.request
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return None
+        # Ссылки на изображения и соседние страницы - абсолютные.
+        parts = (*get_versions((CATALOG_VERSION_CACHE_KEY,
+                                *version_keys)),
+                 request.build_absolute_uri('/'), *parts)
+        digest = md5(repr(parts).encode(), usedforsecurity=False)
+        return f'recipe_response:{digest.hexdigest()}'
+
+    def cached_response(self, cache_key, get_response):
+        """
+        Возвращает ответ из кэша по ключу cache_key (или 304, если
+        у клиента он уже есть), иначе ответ get_response(), который
+        после отрисовки сохраняется в кэше. Без ключа ответ
+        не кэшируется.
+        """
+        if cache_key is None:
+            return get_response()
+
+        def store(response):
+            headers = {header: response[header]
+                       for header in CACHED_HEADERS if header in response}
+            cache.set(cache_key, (response.content, headers),
+                      RECIPE_RESPONSE_CACHE_TIMEOUT)
+
+        entry = cache.get(cache_key)
+        if entry is None:
+            stats_counter.count(RESPONSE_CACHE_MISSES_KEY)
+            response = get_response()
+            if response.status_code == 200:
+                response.add_post_render_callback(store)
+            return response
+
+        stats_counter.count(RESPONSE_CACHE_HITS_KEY)
+        content, headers = entry
+        response = get_conditional_response(
+            self.request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(
+                headers.get('Last-Modified', '')
+            )
+        )
+        if response is None:
+            response = HttpResponse(content)
+        for header, value in headers.items():
+            if header != 'Content-Type' or response.status_code == 200:
+                response[header] = value
+        patch_vary_headers(response, ('Authorization',))
+        return response
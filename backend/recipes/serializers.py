@@ -1,10 +1,13 @@
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 from users.serializers import UserSerializer
-from . import models
-from foodgram_back.constants import MIN_INGREDIENT_AMOUNT, MIN_COOKING_TIME
+from . import images, models, utils
+from .fields import ImageVariantsField, StreamingImageField
+from foodgram_back.constants import (MIN_INGREDIENT_AMOUNT,
+                                     MIN_COOKING_TIME,
+                                     RECIPE_BULK_MAX_SIZE)
 
 User = get_user_model()
 
@@ -37,9 +40,9 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления ингредиентов в рецепте.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=models.Ingredient.objects.all()
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # для всего списка в RecipeWriteSerializer.validate_ingredients.
+    id = serializers.IntegerField()
 
     class Meta:
         model = models.RecipeIngredient
@@ -61,33 +64,67 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientReadSerializer(many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = models.Recipe
         fields = ('id', 'author', 'name', 'text', 'cooking_time',
-                  'image', 'ingredients',
+                  'image', 'image_variants', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart')
         read_only_fields = fields
 
     def get_is_favorited(self, obj):
+        # Рецепты из RecipeViewSet уже аннотированы,
+        # запрос нужен только для одиночного рецепта после записи.
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         return obj.favorite.filter(user=request.user).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
         return obj.shoppingcart.filter(user=request.user).exists()
 
 
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор для замены изображения рецепта строкой base64
+    или файлом из multipart-запроса.
+    """
+    image = StreamingImageField(required=True)
+
+    class Meta:
+        model = models.Recipe
+        fields = ('image',)
+
+    def validate_image(self, value):
+        if not value:
+            raise serializers.ValidationError(
+                'Должна быть фотография'
+            )
+        return value
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            images.replace_recipe_image(instance, validated_data['image'])
+            instance.save(
+                update_fields=('image', 'image_variants', 'updated_at')
+            )
+        return instance
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления и обновления рецептов.
     """
     ingredients = RecipeIngredientWriteSerializer(many=True)
-    image = Base64ImageField(required=True)
+    image = StreamingImageField(required=True)
 
     class Meta:
         model = models.Recipe
@@ -121,27 +158,53 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 'Ингредиенты не должны повторяться'
             )
 
+        existing = set(models.Ingredient.objects.filter(
+            id__in=ingredients
+        ).values_list('id', flat=True))
+        missing = [str(pk) for pk in ingredients if pk not in existing]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}'
+            )
+
         return value
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
-        recipe = models.Recipe.objects.create(**validated_data)
-        self.create_recipe_ingredients(recipe, ingredients_data)
+        image = validated_data.pop('image')
+        with transaction.atomic():
+            recipe = models.Recipe(**validated_data)
+            images.replace_recipe_image(recipe, image)
+            recipe.save()
+            self.create_recipe_ingredients(recipe, ingredients_data)
 
         # Передаем контекст запроса в RecipeReadSerializer
         return recipe
 
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
-        self.validate_ingredients(ingredients_data)
-        instance = super().update(instance, validated_data)
-
-        instance.ingredients.all().delete()
-        self.create_recipe_ingredients(instance, ingredients_data)
+        # При частичном обновлении поле не проверяется на наличие,
+        # содержимое списка уже проверено в validate_ingredients.
+        if ingredients_data is None:
+            raise serializers.ValidationError(
+                'Должен быть хотя бы один ингредиент'
+            )
+        image = validated_data.pop('image', None)
+        with transaction.atomic():
+            if image:
+                images.replace_recipe_image(instance, image)
+            instance = super().update(instance, validated_data)
+            self.update_recipe_ingredients(instance, ingredients_data)
 
         return instance
 
     def to_representation(self, instance):
+        # Перечитываем рецепт с подгруженными связями, чтобы ответ
+        # строился фиксированным числом запросов.
+        user = self.context['request'].user
+        instance = models.Recipe.objects.with_related(user).with_user_flags(
+            user
+        ).get(pk=instance.pk)
         return RecipeReadSerializer(instance, context=self.context).data
 
     @staticmethod
@@ -152,7 +215,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe_ingredients = [
             models.RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient_data['id'],  # Используем ingredient_id
+                ingredient_id=ingredient_data['id'],
                 amount=ingredient_data['amount']
             )
             for ingredient_data in ingredients_data
@@ -160,82 +223,93 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         models.RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
-
-class RecipeUserSerializer(serializers.ModelSerializer):
-    """
-    Базовый сериализатор для обработки запросов на
-    добавление в избранное и список покупок.
-    """
-
-    class Meta:
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        if self.Meta.model.objects.filter(
-            user=data['user'],
-            recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError(
-                {'detail': f'Рецепт уже в {self.Meta.verbose_name}'}
+    @staticmethod
+    def update_recipe_ingredients(recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к новому списку, изменяя только
+        отличающиеся строки: новые создаются, у оставшихся обновляется
+        количество, отсутствующие в списке удаляются.
+        """
+        amounts = {item['id']: item['amount'] for item in ingredients_data}
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in models.RecipeIngredient.objects.filter(
+                recipe=recipe
             )
-        return data
-
-
-class ShoppingCartSerializer(RecipeUserSerializer):
-    """
-    Cериализатор для обработки запросов на добавление рецепта в список покупок.
-    """
-    class Meta(RecipeUserSerializer.Meta):
-        fields = ('user', 'recipe')
-        model = models.ShoppingCart
-        verbose_name = 'списке покупок'
+        }
+        # Изменение количества каждого ингредиента для списков покупок.
+        deltas = {
+            ingredient_id: amount - getattr(existing.get(ingredient_id),
+                                            'amount', 0)
+            for ingredient_id, amount in amounts.items()
+        }
+        deltas.update({
+            ingredient_id: -recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in amounts
+        })
+
+        to_delete = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in existing.items()
+            if ingredient_id not in amounts
+        ]
+        to_update = []
+        for ingredient_id, recipe_ingredient in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        to_create = [
+            models.RecipeIngredient(recipe=recipe,
+                                    ingredient_id=ingredient_id,
+                                    amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
 
+        if to_delete:
+            models.RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            models.RecipeIngredient.objects.bulk_update(to_update,
+                                                        ('amount',))
+        if to_create:
+            models.RecipeIngredient.objects.bulk_create(to_create)
 
-class FavoriteSerializer(RecipeUserSerializer):
-    """
-    Cериализатор для обработки запросов на добавление рецепта в избранное.
-    """
-    class Meta(RecipeUserSerializer.Meta):
-        fields = ('user', 'recipe')
-        model = models.Favorite
-        verbose_name = 'избранном'
+        utils.change_shopping_lists(
+            models.ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('user', flat=True),
+            deltas
+        )
 
 
-class RecipeUserDeleteSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
     """
-    Базовый сериализатор для обработки запросов на удаление из избранного и
-    списка покупок.
+    Сериализатор списка id рецептов для массового добавления
+    в избранное и список покупок или удаления из них.
     """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BULK_MAX_SIZE
+    )
 
-    class Meta:
-        fields = ('user', 'recipe')
-
-    def validate(self, data):
-        if not self.Meta.model.objects.filter(
-            user=data['user'],
-            recipe=data['recipe']
-        ).exists():
-            raise serializers.ValidationError(
-                {'detail': f'Рецепт и так не был в {self.Meta.verbose_name}'}
-            )
-        return data
+    def validate_recipes(self, value):
+        # Повторы убираются с сохранением порядка.
+        return list(dict.fromkeys(value))
 
 
-class ShoppingCartDeleteSerializer(RecipeUserDeleteSerializer):
+class ShoppingListItemSerializer(serializers.ModelSerializer):
     """
-    Cериализатор для обработки запросов на удаление из списка покупок.
+    Сериализатор для строки списка покупок.
     """
-    class Meta:
-        fields = ('user', 'recipe')
-        model = models.ShoppingCart
-        verbose_name = 'списке покупок'
-
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+    measurement_unit = serializers.CharField(
+        source='ingredient.measurement_unit'
+    )
 
-class FavoriteDeleteSerializer(RecipeUserDeleteSerializer):
-    """
-    Cериализатор для обработки запросов на удаление из избранного.
-    """
     class Meta:
-        fields = ('user', 'recipe')
-        model = models.Favorite
-        verbose_name = 'избранном'
+        model = models.ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.core.cache import cache
+from django.dispatch import receiver
+
+from users.serializers import UserSerializer
+from .catalog import bump_catalog_version
+from .models import (Favorite,
+                     Ingredient,
+                     Recipe,
+                     RecipeIngredient,
+                     ShoppingCart,
+                     ShortLink)
+from .response_cache import invalidate_recipe_responses
+from .utils import (add_to_shopping_list,
+                    get_short_link_cache_key,
+                    remove_from_shopping_list,
+                    update_counter)
+
+User = get_user_model()
+
+# Поля пользователя, входящие в ответы с рецептами.
+AUTHOR_FIELDS = frozenset(UserSerializer.Meta.fields)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    # Версия меняется после фиксации транзакции, чтобы другие процессы
+    # не успели перечитать справочник без новых изменений.
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_response_cache(sender, instance, **kwargs):
+    recipe_ids = [instance.pk]
+    transaction.on_commit(lambda: invalidate_recipe_responses(recipe_ids))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredients_response_cache(sender, instance, **kwargs):
+    recipe_ids = [instance.recipe_id]
+    transaction.on_commit(lambda: invalidate_recipe_responses(recipe_ids))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_response_cache(sender, instance, created,
+                                     update_fields, **kwargs):
+    # Ответы с рецептами содержат профиль автора, но не зависят,
+    # например, от времени последнего входа.
+    if created or (update_fields is not None
+                   and not AUTHOR_FIELDS.intersection(update_fields)):
+        return
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(
+            lambda: invalidate_recipe_responses(recipe_ids)
+        )
+
+
+@receiver((post_save, post_delete), sender=ShortLink)
+def invalidate_short_link(sender, instance, **kwargs):
+    # Сбрасывает отметку об отсутствии кода при создании ссылки
+    # и соответствие коду рецепта при ее удалении.
+    cache_key = get_short_link_cache_key(instance.code)
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increase_recipe_counter(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        update_counter(Recipe, instance.recipe_id,
+                       sender.recipe_counter_field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrease_recipe_counter(sender, instance, **kwargs):
+    update_counter(Recipe, instance.recipe_id,
+                   sender.recipe_counter_field, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        add_to_shopping_list(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    # Ингредиенты вычитаются до удаления: при каскадном удалении
+    # рецепта они удаляются вместе с записью списка покупок.
+    remove_from_shopping_list(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        update_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    update_counter(User, instance.author_id, 'recipes_count', -1)
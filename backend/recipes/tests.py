@@ -0,0 +1,735 @@
+import base64
+import io
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import SkipTest, mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (SimpleTestCase,
+                         TestCase,
+                         TransactionTestCase,
+                         override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from foodgram_back.constants import SHORT_LINK_CODE_MIN_LENGTH
+from users.models import Subscription
+from users.pagination import CustomCursorPagination
+from .catalog import IngredientCatalog
+from .management.commands.check_query_plans import (
+    SEQUENTIAL_SCAN_PATTERNS
+)
+from .models import (Favorite,
+                     Ingredient,
+                     Recipe,
+                     RecipeIngredient,
+                     ShoppingCart,
+                     ShortLink)
+from .response_cache import (get_recipe_version_cache_key,
+                             get_stats,
+                             stats_counter)
+from .utils import (SHORT_LINK_CODE_ALPHABET,
+                    delete_rows,
+                    encode_short_link_code,
+                    get_short_link_cache_key,
+                    resolve_short_link,
+                    save_file_on_commit,
+                    update_counter)
+from .views import ShoppingCartBulkView
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image():
+    """
+    Возвращает изображение в base64, как его передает фронтенд.
+    """
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }}
+)
+class QueryCountTestCase(TestCase):
+    """
+    Базовый класс тестов количества запросов к базе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{i}@example.com', username=f'user{i}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for i in range(3)
+        ]
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(40)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return len(context.captured_queries)
+
+    def get_data(self, ingredients, amount=1):
+        return {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'image': make_image(),
+            'ingredients': [{'id': ingredient.id, 'amount': amount}
+                            for ingredient in ingredients],
+        }
+
+
+class RecipeListQueriesTest(QueryCountTestCase):
+    """
+    Количество запросов списка рецептов не зависит от размера страницы.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.users[i % len(cls.users)], name=f'Рецепт {i}',
+                text='Описание', cooking_time=5
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=j + 1)
+                for j, ingredient in enumerate(cls.ingredients[:3])
+            )
+            if i % 2:
+                Favorite.objects.create(user=cls.users[0], recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.users[0],
+                                            recipe=recipe)
+
+    def assert_constant_queries(self, client):
+        queries = self.count_queries(
+            lambda: client.get('/api/recipes/', {'limit': 2})
+        )
+        with self.assertNumQueries(queries):
+            response = client.get('/api/recipes/', {'limit': 50})
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_authenticated_list(self):
+        self.assert_constant_queries(self.client)
+
+    def test_anonymous_list(self):
+        self.assert_constant_queries(APIClient())
+
+
+class RecipeIngredientsQueriesTest(QueryCountTestCase):
+    """
+    Количество запросов при проверке и сохранении ингредиентов рецепта
+    не зависит от их числа.
+    """
+
+    def test_create(self):
+        queries = self.count_queries(lambda: self.client.post(
+            '/api/recipes/', self.get_data(self.ingredients[:1]),
+            format='json'
+        ))
+        with self.assertNumQueries(queries):
+            response = self.client.post(
+                '/api/recipes/', self.get_data(self.ingredients),
+                format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['ingredients']), 40)
+
+    def test_validation(self):
+        # Последний ингредиент не существует, поэтому проверка
+        # доходит до запроса к базе и завершается ошибкой.
+        missing = Ingredient(id=self.ingredients[-1].id + 1)
+        data = self.get_data([missing])
+        queries = self.count_queries(
+            lambda: self.client.post('/api/recipes/', data, format='json')
+        )
+        data = self.get_data(self.ingredients[:-1] + [missing])
+        with self.assertNumQueries(queries):
+            response = self.client.post('/api/recipes/', data,
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeIngredientsUpdateTest(QueryCountTestCase):
+    """
+    При редактировании рецепта перезаписываются только измененные
+    ингредиенты.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.users[0], name='Рецепт', text='Описание',
+            cooking_time=5
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=1)
+            for ingredient in self.ingredients
+        )
+
+    def get_ingredient_writes(self, data):
+        """
+        Изменяет рецепт и возвращает запросы, изменившие его
+        ингредиенты.
+        """
+        table = RecipeIngredient._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(f'/api/recipes/{self.recipe.id}/',
+                                         data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and table in query['sql']
+        ]
+
+    def get_rows(self):
+        return dict(self.recipe.ingredients.values_list('ingredient_id',
+                                                        'id'))
+
+    def test_change_amount(self):
+        rows = self.get_rows()
+        data = self.get_data(self.ingredients)
+        data['ingredients'][0]['amount'] = 5
+        writes = self.get_ingredient_writes(data)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE'))
+        self.assertEqual(self.get_rows(), rows)
+        self.assertEqual(
+            self.recipe.ingredients.get(
+                ingredient=self.ingredients[0]
+            ).amount,
+            5
+        )
+
+    def test_replace_ingredient(self):
+        rows = self.get_rows()
+        data = self.get_data(self.ingredients[1:])
+        writes = self.get_ingredient_writes(data)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('DELETE'))
+        del rows[self.ingredients[0].id]
+        self.assertEqual(self.get_rows(), rows)
+
+    def test_unchanged(self):
+        writes = self.get_ingredient_writes(
+            self.get_data(self.ingredients)
+        )
+        self.assertEqual(writes, [])
+
+
+class CounterFieldsTest(TestCase):
+    """
+    Сохранение устаревшего объекта не затирает счетчики,
+    измененные F()-выражениями.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', first_name='Имя',
+            last_name='Фамилия', password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=5
+        )
+
+    def test_stale_recipe_save(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        update_counter(Recipe, self.recipe.pk, 'favorites_count', 2)
+        update_counter(Recipe, self.recipe.pk, 'cart_count', 1)
+        Recipe.objects.filter(pk=self.recipe.pk).update(trending_score=1.5)
+        stale.name = 'Новое название'
+        stale.save()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+        self.assertEqual(self.recipe.favorites_count, 2)
+        self.assertEqual(self.recipe.cart_count, 1)
+        self.assertEqual(self.recipe.trending_score, 1.5)
+
+    def test_stale_user_save(self):
+        stale = User.objects.get(pk=self.user.pk)
+        subscriber = User.objects.create_user(
+            email='subscriber@example.com', username='subscriber',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        Subscription.objects.create(author=self.user, subscriber=subscriber)
+        stale.first_name = 'Новое имя'
+        stale.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Новое имя')
+        self.assertEqual(self.user.recipes_count, 1)
+        self.assertEqual(self.user.subscribers_count, 1)
+
+
+class QueryPlansTest(TestCase):
+    """
+    Частые запросы на заполненной базе используют индексы
+    (команда check_query_plans).
+    """
+    recipes_count = 2000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if connection.vendor not in SEQUENTIAL_SCAN_PATTERNS:
+            raise SkipTest(
+                f'Планы EXPLAIN для {connection.vendor} не проверяются.'
+            )
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(email=f'user{i}@example.com', username=f'user{i}',
+                 first_name='Имя', last_name='Фамилия')
+            for i in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=users[i % len(users)], name=f'Рецепт {i}',
+                   text='Описание', cooking_time=5)
+            for i in range(cls.recipes_count)
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in recipes[user.id % 10::40]
+            )
+        Subscription.objects.bulk_create(
+            Subscription(author=author, subscriber=subscriber)
+            for subscriber in users
+            for author in users[:10] if author != subscriber
+        )
+        # Статистика для планировщика, как после autovacuum.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=io.StringIO())
+
+    def test_sequential_scan_fails(self):
+        queries = {
+            'поиск по описанию': Recipe.objects.filter(text='x').order_by()
+        }
+        with mock.patch(
+            'recipes.management.commands.check_query_plans.get_hot_queries',
+            return_value=queries
+        ):
+            with self.assertRaises(CommandError):
+                call_command('check_query_plans', stdout=io.StringIO())
+
+
+class IngredientCatalogTest(SimpleTestCase):
+    """
+    Подсказки по индексу подстрок совпадают с полным перебором названий.
+    """
+    NAMES = ('Сахар', 'сахарная пудра', 'Ванильный сахар', 'Соль',
+             'Морская соль', 'Соевый соус', 'Масло сливочное', 'Ассорти',
+             'Сливки', 'Сыр', 'а', 'Баранина')
+
+    def setUp(self):
+        self.catalog = IngredientCatalog(0, [
+            (pk, name, 'г') for pk, name in enumerate(self.NAMES, 1)
+        ])
+
+    def scan(self, value, limit):
+        value = value.lower()
+        names = sorted(name.lower() for name in self.NAMES)
+        found = ([name for name in names if name.startswith(value)]
+                 + [name for name in names
+                    if value in name and not name.startswith(value)])
+        return found[:limit]
+
+    def test_autocomplete(self):
+        values = {'', 'с', 'С', 'а', 'ар', 'сах', 'САХАР', 'соль',
+                  'ль', 'сли', 'ливоч', 'ассорти', 'нет', 'р сах', ' '}
+        for value in values:
+            for limit in (1, 3, len(self.NAMES)):
+                with self.subTest(value=value, limit=limit):
+                    self.assertEqual(
+                        [ingredient['name'].lower() for ingredient
+                         in self.catalog.autocomplete(value, limit)],
+                        self.scan(value, limit)
+                    )
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+}})
+class ShortLinkTest(TestCase):
+    """
+    Коды коротких ссылок уникальны и разрешаются в id рецептов.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', first_name='Имя',
+            last_name='Фамилия', password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=5
+        )
+
+    def test_codes_unique(self):
+        # Миллион номеров: с начала диапазона и вокруг перехода
+        # от четырех символов к пяти.
+        boundary = len(SHORT_LINK_CODE_ALPHABET) ** SHORT_LINK_CODE_MIN_LENGTH
+        numbers = [*range(1, 500_001),
+                   *range(boundary - 250_000, boundary + 250_000)]
+        codes = {number: encode_short_link_code(number)
+                 for number in numbers}
+        self.assertEqual(len(set(codes.values())), len(numbers))
+        self.assertEqual(len(codes[boundary - 1]),
+                         SHORT_LINK_CODE_MIN_LENGTH)
+        self.assertEqual(len(codes[boundary]),
+                         SHORT_LINK_CODE_MIN_LENGTH + 1)
+        self.assertTrue(all(
+            len(code) == SHORT_LINK_CODE_MIN_LENGTH + (number >= boundary)
+            for number, code in codes.items()
+        ))
+
+    def test_resolve(self):
+        response = APIClient().get(f'/api/recipes/{self.recipe.id}/get-link/')
+        code = response.data['short-link'].rstrip('/').rsplit('/', 1)[-1]
+        self.assertEqual(code, encode_short_link_code(self.recipe.id))
+        self.assertEqual(resolve_short_link(code), self.recipe.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_short_link(code), self.recipe.id)
+
+    def test_legacy_code(self):
+        ShortLink.objects.create(recipe=self.recipe, code='abc')
+        self.assertEqual(resolve_short_link('abc'), self.recipe.id)
+
+    def test_missing_code(self):
+        code = encode_short_link_code(self.recipe.id)
+        self.assertIsNone(resolve_short_link(code))
+        # Отсутствие кода кэшируется как 0.
+        self.assertEqual(cache.get(get_short_link_cache_key(code)), 0)
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_short_link(code))
+
+        # Создание ссылки сбрасывает отметку об отсутствии.
+        with self.captureOnCommitCallbacks(execute=True):
+            ShortLink.objects.create(recipe=self.recipe, code=code)
+        self.assertEqual(resolve_short_link(code), self.recipe.id)
+
+
+class RecipeUserToggleTest(QueryCountTestCase):
+    """
+    Переключатели избранного и списка покупок: число запросов,
+    удаление без сигналов и повтор массового добавления при
+    одновременной вставке тех же рецептов.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.create(
+            author=self.users[1], name='Рецепт', text='Описание',
+            cooking_time=5
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=2)
+            for ingredient in self.ingredients[:3]
+        )
+        self.url = f'/api/recipes/{self.recipe.id}/favorite/'
+
+    def test_favorite_toggle_queries(self):
+        # Рецепт для ответа, INSERT и UPDATE счетчика в точке сохранения.
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        # DELETE и UPDATE счетчика в транзакции, без выборки записей.
+        with self.assertNumQueries(4):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_delete_rows(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.recipe)
+        queryset = Favorite.objects.filter(user=self.users[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(delete_rows(queryset), 1)
+        self.assertFalse(queryset.exists())
+        # Сигналы post_delete не вызываются: счетчик не уменьшен.
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_bulk_add_conflict(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        get_added = ShoppingCartBulkView.get_added
+        calls = []
+
+        def get_stale_added(view, request, recipe_ids):
+            # Первая проверка не видит запись, как если бы ее
+            # одновременно вставил другой запрос.
+            added = get_added(view, request, recipe_ids)
+            calls.append(added)
+            if len(calls) == 1:
+                return dict.fromkeys(added, False)
+            return added
+
+        with mock.patch.object(ShoppingCartBulkView, 'get_added',
+                               autospec=True, side_effect=get_stale_added):
+            response = self.client.post(
+                '/api/recipes/shopping_cart/',
+                {'recipes': [self.recipe.id]}, format='json'
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(response.data['results'],
+                         [{'id': self.recipe.id, 'status': 'already_added'}])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.cart_count, 1)
+        self.assertEqual(
+            sorted(self.users[0].shopping_list.values_list('amount',
+                                                           flat=True)),
+            [2, 2, 2]
+        )
+
+
+class ResponseCacheStatsTest(QueryCountTestCase):
+    """
+    Попадания в кэш ответов и промахи считаются в памяти процесса
+    и переносятся в общий кэш при запросе статистики.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        stats_counter.flush()
+        cache.clear()
+
+    def test_counts_without_cache_writes(self):
+        Recipe.objects.create(author=self.users[0], name='Рецепт',
+                              text='Описание', cooking_time=5)
+        client = APIClient()
+        with mock.patch.object(cache, 'incr') as incr:
+            for _ in range(4):
+                self.assertEqual(client.get('/api/recipes/').status_code,
+                                 200)
+        incr.assert_not_called()
+        self.assertEqual(get_stats(),
+                         {'hits': 3, 'misses': 1, 'hit_ratio': 0.75})
+
+
+class DownloadShoppingCartTest(QueryCountTestCase):
+    """
+    Ошибка отрисовки списка покупок возвращается до начала
+    потоковой отдачи файла.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        recipe = Recipe.objects.create(author=self.users[0], name='Рецепт',
+                                       text='Описание', cooking_time=5)
+        RecipeIngredient.objects.create(recipe=recipe,
+                                        ingredient=self.ingredients[0],
+                                        amount=2)
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def test_pdf_error_before_response(self):
+        with mock.patch('recipes.utils.register_pdf_font',
+                        side_effect=OSError('Шрифт не найден')):
+            with self.assertRaises(OSError):
+                self.client.get('/api/recipes/download_shopping_cart/')
+
+    def test_csv(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/',
+                                   {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['Ингредиент,Единица измерения,Количество',
+             'Ингредиент 0,г,2']
+        )
+
+
+class SaveFileOnCommitTest(QueryCountTestCase):
+    """
+    Если хранилище сохранило файл под другим именем, рецепт получает
+    новое имя, время изменения и сброс закэшированных ответов.
+    """
+
+    def test_renamed_file(self):
+        recipe = Recipe.objects.create(author=self.users[0], name='Рецепт',
+                                       text='Описание', cooking_time=5)
+        updated_at = timezone.now() - timedelta(days=1)
+        Recipe.objects.filter(pk=recipe.pk).update(updated_at=updated_at)
+        version_key = get_recipe_version_cache_key(recipe.pk)
+        cache.set(version_key, 1, None)
+
+        storage = Recipe._meta.get_field('image').storage
+        with mock.patch.object(storage, 'save',
+                               return_value='renamed.png'):
+            with self.captureOnCommitCallbacks(execute=True):
+                save_file_on_commit(recipe, 'image',
+                                    ContentFile(b'image', name='image.png'))
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'renamed.png')
+        self.assertGreater(recipe.updated_at, updated_at)
+        self.assertNotEqual(cache.get(version_key), 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class RecipeUserConcurrencyTest(TransactionTestCase):
+    """
+    Одновременные запросы на добавление рецепта в избранное
+    и удаление из него выполняются ровно один раз. SQLite блокирует
+    базу целиком и не допускает одновременной записи, поэтому тест
+    выполняется на PostgreSQL.
+    """
+    threads = 4
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com', username='user', first_name='Имя',
+            last_name='Фамилия', password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=5
+        )
+        self.url = f'/api/recipes/{self.recipe.id}/favorite/'
+
+    def send_parallel(self, method):
+        """
+        Отправляет запросы из нескольких потоков одновременно
+        и возвращает коды ответов.
+        """
+        barrier = threading.Barrier(self.threads)
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return getattr(client, method)(self.url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = [executor.submit(send) for _ in range(self.threads)]
+            return sorted(future.result() for future in futures)
+
+    def test_parallel_add_and_remove(self):
+        self.assertEqual(self.send_parallel('post'),
+                         [201] + [400] * (self.threads - 1))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        self.assertEqual(self.send_parallel('delete'),
+                         [204] + [400] * (self.threads - 1))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertFalse(Favorite.objects.exists())
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """
+    Курсорная пагинация проходит все рецепты, даже если значения
+    первого поля сортировки совпадают у большего числа рецептов,
+    чем offset_cutoff.
+    """
+    recipes_count = CustomCursorPagination.offset_cutoff + 250
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user', first_name='Имя',
+            last_name='Фамилия', password='password'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.user, name=f'Рецепт {i}', text='Описание',
+                   cooking_time=5)
+            for i in range(cls.recipes_count)
+        )
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_all_pages(self, ordering):
+        url = f'/api/recipes/?cursor=&limit=100&ordering={ordering}'
+        pages = []
+        while url and len(pages) <= self.recipes_count // 100:
+            response = self.client.get(url)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data['next']
+        self.assertIsNone(url)
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(len(ids), self.recipes_count)
+        self.assertEqual(len(set(ids)), self.recipes_count)
+
+        # Ссылка назад с третьей страницы ведет на вторую.
+        response = self.client.get(
+            f'/api/recipes/?cursor=&limit=100&ordering={ordering}'
+        )
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']], pages[1]
+        )
+
+    def test_newest_ties(self):
+        self.assert_all_pages('newest')
+
+    def test_popular_ties(self):
+        # Часть рецептов отличается счетчиком, остальные совпадают
+        # и по счетчику, и по дате публикации.
+        Recipe.objects.filter(
+            id__in=Recipe.objects.values('id')[:200]
+        ).update(favorites_count=3)
+        self.assert_all_pages('popular')
+
+    def test_trending_ties(self):
+        Recipe.objects.filter(
+            id__in=Recipe.objects.values('id')[:200]
+        ).update(trending_score=0.5)
+        self.assert_all_pages('trending')
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
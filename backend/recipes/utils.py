@@ -1,13 +1,130 @@
+import functools
+import hashlib
+import io
+import json
 import os
+import string
+import tempfile
 
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics, ttfonts
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.urls import reverse
-from django.db.models import Sum
+from django.db.models import (Case, Count, F, IntegerField, OuterRef,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest
 
-from .models import RecipeIngredient
+from foodgram_back.constants import (SHOPPING_LIST_CACHE_MAX_SIZE,
+                                     SHOPPING_LIST_CACHE_TIMEOUT,
+                                     SHOPPING_LIST_SPOOL_MAX_SIZE,
+                                     SHORT_LINK_CACHE_TIMEOUT,
+                                     SHORT_LINK_CODE_MIN_LENGTH,
+                                     SHORT_LINK_MISSING_CACHE_TIMEOUT)
+from .models import (Recipe,
+                     RecipeIngredient,
+                     ShoppingCart,
+                     ShoppingListItem,
+                     ShortLink)
+
+PDF_FONT_NAME = 'ComicSansMS'
+
+SHORT_LINK_CODE_ALPHABET = string.digits + string.ascii_letters
+# Множитель перестановки номеров для кодов коротких ссылок: взаимно
+# прост с 62, поэтому умножение по модулю 62^n - биекция.
+SHORT_LINK_CODE_MULTIPLIER = 1_000_003
+
+
+def update_counter(model, pk, field_name, delta):
+    """
+    Функция атомарно изменяет счетчик объекта F()-выражением,
+    не опуская его ниже нуля.
+    """
+    model.objects.filter(pk=pk).update(
+        **{field_name: Greatest(F(field_name) + delta, 0)}
+    )
+
+
+def delete_rows(queryset):
+    """
+    Функция удаляет строки queryset одним запросом DELETE, без
+    предварительной выборки объектов и сигналов post_delete,
+    и возвращает количество удаленных строк. Подходит только
+    для моделей, на которые не ссылаются другие таблицы.
+    """
+    # QuerySet.delete() выполняет один DELETE только для моделей без
+    # сигналов удаления, а у списков рецептов и подписок они есть.
+    # Поэтому используется закрытый метод, которым сам Collector
+    # удаляет строки без выборки (django.db.models.deletion). Его
+    # поведение проверяет recipes.tests.RecipeUserToggleTest.
+    return queryset._raw_delete(queryset.db)
+
+
+def recount_recipe_counter(model, recipe_ids):
+    """
+    Функция пересчитывает счетчик рецептов recipe_ids по фактическому
+    количеству записей model после массового изменения без сигналов.
+    """
+    Recipe.objects.filter(id__in=recipe_ids).update(**{
+        model.recipe_counter_field: count_subquery(model.objects, 'recipe')
+    })
+
+
+def count_subquery(queryset, field_name):
+    """
+    Функция возвращает подзапрос с количеством строк queryset,
+    связанных с внешним объектом через поле field_name.
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{field_name: OuterRef('pk')}).order_by().values(
+            field_name
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def save_file_on_commit(instance, field_name, content):
+    """
+    Функция назначает файл полю модели сразу, а записывает его
+    в хранилище только после фиксации транзакции. При откате
+    транзакции файл не создается, а медленная запись на диск
+    не удерживает блокировки строк.
+    """
+    field = instance._meta.get_field(field_name)
+    name = field.storage.get_available_name(
+        field.generate_filename(instance, content.name),
+        max_length=field.max_length
+    )
+    # Строка вместо файла: модель сохранит имя, не трогая хранилище.
+    setattr(instance, field_name, name)
+
+    def save():
+        saved_name = field.storage.save(name, content,
+                                        max_length=field.max_length)
+        # Временный файл загрузки хранилище могло переместить,
+        # закрываем его явно, а не при сборке мусора.
+        content.close()
+        if saved_name != name:
+            # Сохранение, а не UPDATE: обновляются поля auto_now
+            # (время изменения для ETag), а сигнал post_save
+            # сбрасывает закэшированные ответы со старым именем.
+            setattr(instance, field_name, saved_name)
+            instance.save(update_fields=[field.name, *(
+                model_field.name
+                for model_field in instance._meta.concrete_fields
+                if getattr(model_field, 'auto_now', False)
+            )])
+
+    transaction.on_commit(save)
+
+
+def delete_file_on_commit(storage, name):
+    """
+    Функция удаляет файл из хранилища после фиксации транзакции.
+    """
+    if name:
+        transaction.on_commit(lambda: storage.delete(name))
 
 
 def get_short_link(code):
@@ -22,50 +139,227 @@ def get_short_link(code):
     return f'{scheme}://{domain}{relative_url}'
 
 
-def get_pdf_from_recipe_list(buffer, recipes):
+def encode_short_link_code(number):
     """
-    Функция принимет queryset рецептов и заполняет буфер данными,
-    представляющими собой список покупок в формате pdf.
+    Функция взаимно однозначно переводит номер (id рецепта) в код
+    короткой ссылки: номер переставляется внутри диапазона 62^n
+    и записывается в base62 ровно n символами. Длина n - наименьшая,
+    не меньше SHORT_LINK_CODE_MIN_LENGTH, при которой номер < 62^n,
+    поэтому с ростом номеров коды удлиняются сами.
+    """
+    base = len(SHORT_LINK_CODE_ALPHABET)
+    length = SHORT_LINK_CODE_MIN_LENGTH
+    while number >= base ** length:
+        length += 1
+
+    value = number * SHORT_LINK_CODE_MULTIPLIER % base ** length
+    code = []
+    for _ in range(length):
+        value, digit = divmod(value, base)
+        code.append(SHORT_LINK_CODE_ALPHABET[digit])
+    return ''.join(reversed(code))
+
+
+def get_short_link_cache_key(code):
+    return f'short_link:{code}'
+
+
+def resolve_short_link(code):
+    """
+    Функция возвращает id рецепта по коду короткой ссылки или None.
+    Результат кэшируется, в том числе отсутствие кода (как 0),
+    поэтому повторные переходы не обращаются к базе.
     """
+    cache_key = get_short_link_cache_key(code)
+    recipe_id = cache.get(cache_key)
+    if recipe_id is None:
+        recipe_id = ShortLink.objects.filter(code=code).values_list(
+            'recipe_id', flat=True
+        ).first() or 0
+        cache.set(cache_key, recipe_id,
+                  SHORT_LINK_CACHE_TIMEOUT if recipe_id
+                  else SHORT_LINK_MISSING_CACHE_TIMEOUT)
+    return recipe_id or None
 
-    # Устанавливаем новый шрифт, так как по-умолчанию
-    # русский язык не поддерживается.
+
+@functools.cache
+def register_pdf_font():
+    """
+    Регистрирует шрифт для pdf один раз на процесс, так как
+    по-умолчанию русский язык не поддерживается.
+    """
     font_path = os.path.join(settings.STATIC_ROOT, 'ComicSansMS.ttf')
-    pdfmetrics.registerFont(ttfonts.TTFont('ComicSansMS', font_path))
+    pdfmetrics.registerFont(ttfonts.TTFont(PDF_FONT_NAME, font_path))
+
+
+def get_recipe_amounts(recipe_ids):
+    """
+    Функция возвращает словарь id ингредиента -> суммарное
+    количество по рецептам recipe_ids.
+    """
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by().values('ingredient').annotate(
+        total_amount=Sum('amount')
+    ).values_list('ingredient', 'total_amount'))
+
+
+def change_shopping_lists(user_ids, deltas):
+    """
+    Функция изменяет списки покупок пользователей user_ids на величины
+    deltas (id ингредиента -> изменение количества). Недостающие строки
+    создаются с нулевым количеством, после чего все строки меняются
+    одним UPDATE, поэтому одновременные изменения не теряются.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          amount=0)
+         for user_id in user_ids
+         for ingredient_id, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids,
+                                            ingredient_id__in=deltas)
+    items.update(amount=Greatest(F('amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(delta))
+          for ingredient_id, delta in deltas.items()),
+        output_field=IntegerField()
+    ), 0))
+    if any(delta < 0 for delta in deltas.values()):
+        items.filter(amount=0).delete()
+
+
+def add_to_shopping_list(user_id, recipe_ids):
+    """
+    Функция добавляет ингредиенты рецептов в список покупок пользователя.
+    """
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_ids))
+
+
+def remove_from_shopping_list(user_id, recipe_ids):
+    """
+    Функция вычитает ингредиенты рецептов из списка покупок пользователя.
+    """
+    change_shopping_lists([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_ids).items()
+    })
+
+
+def rebuild_shopping_lists(users=None):
+    """
+    Функция заново собирает списки покупок пользователей users
+    (по-умолчанию - всех) из рецептов в их списках покупок.
+    Возвращает количество созданных строк.
+    """
+    items = ShoppingListItem.objects.all()
+    carts = ShoppingCart.objects.all()
+    if users is not None:
+        items = items.filter(user__in=users)
+        carts = carts.filter(user__in=users)
+
+    rows = carts.filter(recipe__ingredients__isnull=False).order_by().values(
+        'user', ingredient=F('recipe__ingredients__ingredient')
+    ).annotate(total_amount=Sum('recipe__ingredients__amount'))
+    with transaction.atomic():
+        items.delete()
+        created = ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(user_id=row['user'],
+                             ingredient_id=row['ingredient'],
+                             amount=row['total_amount'])
+            for row in rows
+        )
+    return len(created)
+
+
+def get_shopping_list(user):
+    """
+    Функция возвращает список ингредиентов с суммарным
+    количеством из списка покупок пользователя.
+    """
+    return list(ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        total_amount=F('amount')
+    ).order_by('ingredient__name'))
+
+
+def get_shopping_list_cache_key(ingredients_data):
+    """
+    Функция формирует ключ кэша по содержимому списка покупок.
+    """
+    content = json.dumps(ingredients_data, ensure_ascii=False,
+                         sort_keys=True)
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f'shopping_list_pdf:{digest}'
+
+
+def format_shopping_list_item(ingredient_data):
+    """
+    Функция формирует строку списка покупок для одного ингредиента.
+    """
+    return (f'• {ingredient_data["ingredient__name"]}'
+            f' ({ingredient_data["ingredient__measurement_unit"]}) '
+            f'– {ingredient_data["total_amount"]}')
+
+
+def get_pdf_from_shopping_list(buffer, ingredients_data):
+    """
+    Функция принимает список ингредиентов и заполняет буфер данными,
+    представляющими собой список покупок в формате pdf.
+    """
+    register_pdf_font()
 
-    # Создаем PDF-файл в памяти.
     pdf = canvas.Canvas(buffer, pagesize=letter)
     width, height = letter
 
     # Заголовок.
-    pdf.setFont('ComicSansMS', 16)
+    pdf.setFont(PDF_FONT_NAME, 16)
     pdf.drawCentredString(width / 2, height - 40, 'Список покупок')
 
     # Основной текст.
     y = height - 80
-    pdf.setFont('ComicSansMS', 12)
-
-    # Получаем все ингредиенты одним запросом с агрегацией и аннотацией.
-    ingredients_data = RecipeIngredient.objects.filter(
-        recipe__in=recipes
-    ).values(
-        'ingredient__name',
-        'ingredient__measurement_unit'
-    ).annotate(
-        total_amount=Sum('amount')
-    ).order_by('ingredient__name')
+    pdf.setFont(PDF_FONT_NAME, 12)
 
     for ingredient_data in ingredients_data:
-        pdf.drawString(
-            50,
-            y,
-            f'• {ingredient_data["ingredient__name"]}'
-            f' ({ingredient_data["ingredient__measurement_unit"]}) '
-            f'– {ingredient_data["total_amount"]}'
-        )
+        pdf.drawString(50, y, format_shopping_list_item(ingredient_data))
         y -= 20
         if y < 50:
             pdf.showPage()
             y = height - 40
 
     pdf.save()
+
+
+def get_shopping_list_pdf_file(ingredients_data):
+    """
+    Функция возвращает файловый объект с pdf списка покупок.
+    Документы кэшируются по содержимому, поэтому
+    для неизменившегося списка повторная отрисовка не выполняется.
+    """
+    cache_key = get_shopping_list_cache_key(ingredients_data)
+
+    content = cache.get(cache_key)
+    if content is not None:
+        return io.BytesIO(content)
+
+    # Небольшие документы собираются в памяти,
+    # крупные - во временном файле на диске.
+    file = tempfile.SpooledTemporaryFile(
+        max_size=SHOPPING_LIST_SPOOL_MAX_SIZE
+    )
+    get_pdf_from_shopping_list(file, ingredients_data)
+
+    if file.tell() <= SHOPPING_LIST_CACHE_MAX_SIZE:
+        file.seek(0)
+        cache.set(cache_key, file.read(), SHOPPING_LIST_CACHE_TIMEOUT)
+
+    file.seek(0)
+    return file
@@ -1,50 +1,221 @@
-import string
-import random
-import io
+from functools import partial
 
-from wsgiref.util import FileWrapper
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse
 from rest_framework.viewsets import ReadOnlyModelViewSet, ModelViewSet
-from rest_framework.filters import SearchFilter
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
+from rest_framework import generics, status
+from rest_framework.permissions import (AllowAny,
+                                        IsAdminUser,
+                                        IsAuthenticatedOrReadOnly,
                                         IsAuthenticated)
 from django_filters.rest_framework import DjangoFilterBackend
 
-from foodgram_back.constants import SHORT_LINK_CODE_MAX_LENGTH
+from foodgram_back.constants import (INGREDIENT_AUTOCOMPLETE_LIMIT,
+                                     INGREDIENT_AUTOCOMPLETE_MAX_LIMIT)
 from users.serializers import ShortRecipeSerializer
-from users.pagination import CustomLimitPagination
-from . import (permissions,
+from users.models import Subscription
+from users.pagination import RecipeCursorPagination, RecipeLimitPagination
+from . import (parsers,
+               permissions,
+               renderers,
+               representations,
                serializers,
                filters,
                models,
                utils)
+from .catalog import (get_catalog_modified,
+                      get_catalog_version,
+                      get_ingredient_catalog)
+from .conditional import ConditionalGetMixin
+from .response_cache import (RECIPE_LIST_VERSION_CACHE_KEY,
+                             AnonymousResponseCacheMixin,
+                             get_recipe_version_cache_key,
+                             get_stats)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     """
     Вьюсет для получения списка ингредиентов или одиночного ингредиента.
+    Данные отдаются из снимка справочника в памяти процесса,
+    ETag строится по версии справочника и параметрам запроса.
     """
     queryset = models.Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
-    filter_backends = (SearchFilter,)
-    search_fields = ('^name',)
+    renderer_classes = (renderers.FastJSONRenderer, BrowsableAPIRenderer)
+
+    def catalog_response(self, get_data):
+        """
+        Ответ с данными get_data() из снимка справочника или 304,
+        если у клиента ответ той же версии справочника.
+        """
+        version = get_catalog_version()
+        etag = self.get_etag(version, self.action, self.kwargs.get('pk'),
+                             sorted(self.request.query_params.lists()))
+        return self.conditional_response(
+            etag, get_catalog_modified(version),
+            lambda: Response(get_data(get_ingredient_catalog()))
+        )
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return self.catalog_response(
+                lambda catalog: catalog.startswith(name)
+            )
+        return self.catalog_response(lambda catalog: catalog.all())
+
+    def retrieve(self, request, pk=None):
+        return self.catalog_response(partial(self.get_ingredient, pk))
+
+    @staticmethod
+    def get_ingredient(pk, catalog):
+        try:
+            ingredient = catalog.get(int(pk))
+        except ValueError:
+            ingredient = None
+        if ingredient is None:
+            raise Http404
+        return ingredient
+
+    @action(detail=False)
+    def autocomplete(self, request):
+        """
+        Подсказки для редактора рецепта: ограниченный список,
+        сначала совпадения по началу названия, затем по вхождению.
+        """
+        try:
+            limit = int(request.query_params.get(
+                'limit', INGREDIENT_AUTOCOMPLETE_LIMIT
+            ))
+        except ValueError:
+            raise ValidationError('Параметр limit - не число')
+        limit = min(max(limit, 1), INGREDIENT_AUTOCOMPLETE_MAX_LIMIT)
+
+        return self.catalog_response(lambda catalog: catalog.autocomplete(
+            request.query_params.get('name', ''), limit
+        ))
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ConditionalGetMixin,
+                    ModelViewSet):
     """
     Вьюсет для работы с рецептами.
+    Список и отдельный рецепт отдаются с ETag по столбцам версий,
+    анонимным пользователям - из кэша ответов.
     """
     queryset = models.Recipe.objects.all()
-    pagination_class = CustomLimitPagination
+    pagination_class = RecipeLimitPagination
+    parser_classes = parsers.IMAGE_UPLOAD_PARSERS
+    renderer_classes = (renderers.FastJSONRenderer, BrowsableAPIRenderer)
     permission_classes = (IsAuthenticatedOrReadOnly,
                           permissions.AuthorOrReadOnly)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, filters.RecipeOrderingFilter)
     filterset_class = filters.RecipeFilter
 
+    def get_queryset(self):
+        user = self.request.user
+        queryset = models.Recipe.objects.with_user_flags(user)
+        if self.action in ('list', 'feed'):
+            # Списки строятся из строк values_list, авторы
+            # и ингредиенты подгружаются после проверки ETag.
+            return queryset.with_versions(user)
+        return queryset.with_related(user)
+
+    @staticmethod
+    def get_recipe_version(recipe):
+        """
+        Все, от чего зависит представление рецепта, аннотированного
+        через with_user_flags и with_versions, кроме справочника
+        ингредиентов.
+        """
+        return (recipe.id, recipe.updated_at, recipe.author_updated_at,
+                recipe.is_favorited, recipe.is_in_shopping_cart,
+                recipe.author_is_subscribed)
+
+    def get_list_cache_key(self):
+        params = self.request.query_params
+        ordering_filter = filters.RecipeOrderingFilter
+        if params.get(ordering_filter.ordering_param) in (
+            ordering_filter.orderings.keys()
+            - {ordering_filter.default_ordering}
+        ):
+            # Порядок по популярности меняется вместе со счетчиками,
+            # без сигналов, поэтому такие списки не кэшируются.
+            return None
+        # Ключ строится по всем параметрам: ссылки на соседние
+        # страницы в ответе повторяют строку запроса целиком.
+        return self.get_response_cache_key(
+            (RECIPE_LIST_VERSION_CACHE_KEY,), sorted(params.lists())
+        )
+
+    def get_detail_cache_key(self, pk):
+        try:
+            pk = int(pk)
+        except ValueError:
+            return None
+        return self.get_response_cache_key(
+            (get_recipe_version_cache_key(pk),), pk
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(self.get_list_cache_key(),
+                                    partial(self.get_list_response, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            self.get_detail_cache_key(kwargs['pk']),
+            partial(self.get_detail_response, request, *args, **kwargs)
+        )
+
+    def get_list_response(self, request):
+        # Список строится из строк values_list без DRF-сериализатора,
+        # см. recipes.representations.
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()).values_list(
+                *representations.RECIPE_COLUMNS, named=True
+            )
+        )
+        # Количество и ссылки на соседние страницы без самих рецептов.
+        envelope = self.get_paginated_response([]).data
+        etag = self.get_etag(
+            get_catalog_version(), envelope,
+            [self.get_recipe_version(recipe) for recipe in page]
+        )
+
+        def get_response():
+            return self.get_paginated_response(
+                representations.get_recipes(page, request)
+            )
+
+        # Удаление рецепта не оставляет времени изменения,
+        # поэтому у списка есть только ETag.
+        return self.conditional_response(etag, None, get_response)
+
+    def get_detail_response(self, request, *args, **kwargs):
+        user = request.user
+        recipe = generics.get_object_or_404(
+            models.Recipe.objects.only('id', 'updated_at').with_user_flags(
+                user
+            ).with_versions(user),
+            pk=kwargs['pk']
+        )
+        version = get_catalog_version()
+        return self.conditional_response(
+            self.get_etag(version, self.get_recipe_version(recipe)),
+            self.get_last_modified(recipe.updated_at,
+                                   recipe.author_updated_at,
+                                   get_catalog_modified(version)),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PUT', 'PATCH'):
             return serializers.RecipeWriteSerializer
@@ -55,6 +226,39 @@ class RecipeViewSet(ModelViewSet):
         context['request'] = self.request
         return context
 
+    @action(detail=False, permission_classes=(IsAuthenticated,),
+            pagination_class=RecipeCursorPagination)
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+        Подписки проверяются подзапросом, страницы - по курсору.
+        """
+        queryset = self.filter_queryset(self.get_queryset().filter(
+            author__in=Subscription.objects.filter(
+                subscriber=request.user
+            ).values('author')
+        ))
+        page = self.paginate_queryset(queryset.values_list(
+            *representations.RECIPE_COLUMNS, named=True
+        ))
+        return self.get_paginated_response(
+            representations.get_recipes(page, request)
+        )
+
+    @action(detail=True, methods=('put',))
+    def image(self, request, pk=None):
+        """
+        Замена изображения рецепта: строкой base64 в json
+        или файлом в multipart-запросе.
+        """
+        serializer = serializers.RecipeImageSerializer(
+            self.get_object(), data=request.data,
+            context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -62,57 +266,75 @@ class RecipeViewSet(ModelViewSet):
         serializer.save()
 
 
+class RecipeResponseCacheStatsView(APIView):
+    """
+    Представление для получения статистики кэша ответов
+    анонимным пользователям: попаданий и промахов.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats())
+
+
 class GetShortLinkView(APIView):
     """
     Представление для получения короткой ссылки на рецепт.
+    Код вычисляется по id рецепта, поэтому не требует проверки
+    на совпадение с уже выданными.
     """
     def get(self, request, pk):
-        recipe = get_object_or_404(models.Recipe, pk=pk)
+        recipe = get_object_or_404(models.Recipe.objects.only('id'), pk=pk)
         short_link, _ = models.ShortLink.objects.get_or_create(
             recipe=recipe,
-            defaults={'code': self.generate_unique_code()}
+            defaults={'code': utils.encode_short_link_code(recipe.id)}
         )
 
         return Response({'short-link': utils.get_short_link(short_link.code)})
 
-    @staticmethod
-    def generate_unique_code():
-        characters = string.ascii_letters + string.digits
-        code_length = SHORT_LINK_CODE_MAX_LENGTH
-
-        while True:
-            code = ''.join(random.choices(characters, k=code_length))
-            if not models.ShortLink.objects.filter(code=code).exists():
-                return code
-
 
 class ShortLinkView(APIView):
     """
     Представление для обработки короткой ссылки на рецепт.
+    Ссылка открывается без аутентификации, id рецепта берется из кэша.
     """
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
     def get(self, request, code):
-        short_link = get_object_or_404(models.ShortLink, code=code)
-        return redirect(f'/recipes/{short_link.recipe.id}')
+        recipe_id = utils.resolve_short_link(code)
+        if recipe_id is None:
+            raise Http404
+        return redirect(f'/recipes/{recipe_id}')
 
 
 class RecipeUserView(APIView):
     """
     Базовое представление для добавления или удаления рецепта из списка.
+    Повторное добавление отсекается уникальным ограничением в базе,
+    поэтому одновременные запросы не приводят к ошибке сервера.
     """
-    serializer_class = None
-    delete_serializer_class = None
     model_class = None
+    verbose_name = None
+
+    def after_delete(self, user, recipe_ids):
+        """
+        Вызывается после удаления рецептов из списка пользователя.
+        """
 
     def post(self, request, recipe_id):
-        recipe = get_object_or_404(models.Recipe, id=recipe_id)
-        serializer = self.serializer_class(
-            data={
-                'user': request.user.id,
-                'recipe': recipe.id
-            },
+        recipe = get_object_or_404(
+            models.Recipe.objects.only(*ShortRecipeSerializer.Meta.fields),
+            id=recipe_id
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            with transaction.atomic():
+                self.model_class.objects.create(user=request.user,
+                                                recipe=recipe)
+        except IntegrityError:
+            raise ValidationError(
+                {'detail': [f'Рецепт уже в {self.verbose_name}']}
+            )
 
         return Response(
             ShortRecipeSerializer(recipe).data,
@@ -120,65 +342,235 @@ class RecipeUserView(APIView):
         )
 
     def delete(self, request, recipe_id):
-        recipe = get_object_or_404(models.Recipe, id=recipe_id)
-        serializer = self.delete_serializer_class(
-            data={
-                'user': request.user.id,
-                'recipe': recipe.id
-            },
-        )
-        serializer.is_valid(raise_exception=True)
-
-        item = get_object_or_404(
-            self.model_class,
-            user=request.user,
-            recipe_id=recipe_id
-        )
-        item.delete()
+        with transaction.atomic():
+            deleted = utils.delete_rows(self.model_class.objects.filter(
+                user=request.user, recipe_id=recipe_id
+            ))
+            if deleted:
+                # Строки удалены без сигналов, счетчик обновляется здесь.
+                utils.update_counter(models.Recipe, recipe_id,
+                                     self.model_class.recipe_counter_field,
+                                     -deleted)
+                self.after_delete(request.user, [recipe_id])
+
+        if not deleted:
+            get_object_or_404(models.Recipe, id=recipe_id)
+            raise ValidationError(
+                {'detail': [f'Рецепт и так не был в {self.verbose_name}']}
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ShoppingCartView(RecipeUserView):
+class ShoppingListMixin:
+    """
+    Миксин для представлений списка покупок: поддерживает сводный
+    список ингредиентов при массовых изменениях без сигналов.
+    """
+    def after_create(self, user, recipe_ids):
+        utils.add_to_shopping_list(user.id, recipe_ids)
+
+    def after_delete(self, user, recipe_ids):
+        utils.remove_from_shopping_list(user.id, recipe_ids)
+
+
+class ShoppingCartView(ShoppingListMixin, RecipeUserView):
     """
     Представление для добавления рецепта в список покупок или его удаления.
     """
-    serializer_class = serializers.ShoppingCartSerializer
-    delete_serializer_class = serializers.ShoppingCartDeleteSerializer
     model_class = models.ShoppingCart
+    verbose_name = 'списке покупок'
 
 
 class FavoriteView(RecipeUserView):
     """
     Представление для добавления рецепта в избранное или его удаления.
     """
-    serializer_class = serializers.FavoriteSerializer
-    delete_serializer_class = serializers.FavoriteDeleteSerializer
     model_class = models.Favorite
+    verbose_name = 'избранном'
+
+
+class RecipeUserBulkView(APIView):
+    """
+    Базовое представление для массового добавления рецептов в список
+    или их удаления. Возвращает результат для каждого переданного id.
+    """
+    model_class = None
+
+    def after_create(self, user, recipe_ids):
+        """
+        Вызывается после добавления рецептов в список пользователя.
+        """
+
+    def after_delete(self, user, recipe_ids):
+        """
+        Вызывается после удаления рецептов из списка пользователя.
+        """
+
+    def get_recipe_ids(self, request):
+        serializer = serializers.RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    def get_added(self, request, recipe_ids):
+        """
+        Одним запросом проверяет существование рецептов и возвращает
+        словарь id рецепта -> признак наличия в списке пользователя.
+        """
+        return dict(models.Recipe.objects.filter(
+            id__in=recipe_ids
+        ).annotate(is_added=Exists(self.model_class.objects.filter(
+            user=request.user, recipe=OuterRef('pk')
+        ))).values_list('id', 'is_added'))
+
+    @staticmethod
+    def get_response(recipe_ids, added, statuses):
+        return Response({'results': [
+            {'id': recipe_id, 'status': statuses[added.get(recipe_id)]}
+            for recipe_id in recipe_ids
+        ]})
+
+    def post(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            while True:
+                added = self.get_added(request, recipe_ids)
+                # Записи вставляются в одном порядке, поэтому
+                # одновременные запросы не блокируют друг друга по кругу.
+                new_ids = sorted(
+                    pk for pk, is_added in added.items() if not is_added
+                )
+                try:
+                    with transaction.atomic():
+                        self.model_class.objects.bulk_create(
+                            self.model_class(user=request.user,
+                                             recipe_id=pk)
+                            for pk in new_ids
+                        )
+                except IntegrityError:
+                    # Часть рецептов одновременно добавил другой запрос:
+                    # проверка повторяется, чтобы список покупок
+                    # изменился только на действительно вставленные.
+                    continue
+                break
+            if new_ids:
+                utils.recount_recipe_counter(self.model_class, new_ids)
+                self.after_create(request.user, new_ids)
+
+        return self.get_response(recipe_ids, added, {
+            None: 'not_found', False: 'added', True: 'already_added'
+        })
+
+    def delete(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            added = self.get_added(request, recipe_ids)
+            # Удаляемые записи блокируются: записи, которые успел
+            # удалить другой запрос, в выборку не попадут.
+            old_ids = set(self.model_class.objects.filter(
+                user=request.user,
+                recipe_id__in=[pk for pk, is_added in added.items()
+                               if is_added]
+            ).select_for_update().values_list('recipe_id', flat=True))
+            added = {pk: pk in old_ids for pk in added}
+            if old_ids:
+                utils.delete_rows(self.model_class.objects.filter(
+                    user=request.user, recipe_id__in=old_ids
+                ))
+                utils.recount_recipe_counter(self.model_class, old_ids)
+                self.after_delete(request.user, old_ids)
+
+        return self.get_response(recipe_ids, added, {
+            None: 'not_found', False: 'not_added', True: 'removed'
+        })
+
+
+class ShoppingCartBulkView(ShoppingListMixin, RecipeUserBulkView):
+    """
+    Представление для массового добавления рецептов в список покупок
+    или их удаления.
+    """
+    model_class = models.ShoppingCart
+
+
+class FavoriteBulkView(RecipeUserBulkView):
+    """
+    Представление для массового добавления рецептов в избранное
+    или их удаления.
+    """
+    model_class = models.Favorite
+
+
+class ClearShoppingCartView(APIView):
+    """
+    Представление для очистки списка покупок пользователя.
+    """
+    def delete(self, request):
+        with transaction.atomic():
+            # Удаляются только заблокированные записи, поэтому рецепт,
+            # одновременно добавленный другим запросом, останется
+            # в списке вместе со своими ингредиентами и счетчиком.
+            recipe_ids = list(models.ShoppingCart.objects.filter(
+                user=request.user
+            ).select_for_update().values_list('recipe_id', flat=True))
+            if recipe_ids:
+                utils.delete_rows(models.ShoppingCart.objects.filter(
+                    user=request.user, recipe_id__in=recipe_ids
+                ))
+                models.Recipe.objects.filter(id__in=recipe_ids).update(
+                    cart_count=Greatest(F('cart_count') - 1, 0)
+                )
+                utils.remove_from_shopping_list(request.user.id, recipe_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ShoppingListView(APIView):
+    """
+    Представление для получения текущего списка покупок:
+    суммарного количества каждого ингредиента.
+    """
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        items = request.user.shopping_list.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+        return Response(
+            serializers.ShoppingListItemSerializer(items, many=True).data
+        )
 
 
 class DownloadShoppingCartView(APIView):
     """
     Представление для того, чтобы скачать список покупок.
+    Формат выбирается параметром format (pdf, txt, csv)
+    или заголовком Accept, по-умолчанию - pdf.
     """
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (renderers.ShoppingListPDFRenderer,
+                        renderers.ShoppingListTXTRenderer,
+                        renderers.ShoppingListCSVRenderer)
 
     def get(self, request, format=None):
-        recipes = models.Recipe.objects.filter(
-            shoppingcart__user=self.request.user
-        ).prefetch_related('recipes')
+        ingredients_data = utils.get_shopping_list(request.user)
 
-        # Создаем буфер в памяти.
-        buffer = io.BytesIO()
-        try:
-            utils.get_pdf_from_recipe_list(buffer, recipes)
-        except MemoryError:
-            return Response(
-                {'detail': 'Недостаточно памяти для создания pdf.'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
 
-        # Перематываем буфер в начало и передаем его в ответ.
-        buffer.seek(0)
-        return HttpResponse(
-            FileWrapper(buffer),
-            content_type='application/pdf')
+        # Отдаем документ потоком, не собирая его целиком в памяти.
+        response = StreamingHttpResponse(
+            renderer.prepared_stream(ingredients_data),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'inline; filename="shopping_list.{renderer.format}"'
+        )
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Ошибки отдаются в json независимо от запрошенного формата.
+        if isinstance(response, Response) and response.exception:
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -28,7 +28,7 @@ class RecipesInLine(admin.TabularInline):
     def get_extra(self, request, obj=None, **kwargs):
         extra = 1
         if obj:
-            return extra - obj.recipes.count()
+            return extra - obj.recipes_count
         return extra
 
 
@@ -36,6 +36,7 @@ class UserAdmin(admin.ModelAdmin):
     model = User
     inlines = (RecipesInLine,)
     search_fields = ('username', 'email')
+    readonly_fields = ('recipes_count', 'subscribers_count')
 
 
 admin.site.register(User, UserAdmin)
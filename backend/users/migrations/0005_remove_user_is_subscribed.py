@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 03:51
+
+import users.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_rename_user_subscription_author'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='is_subscribed',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 04:07
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Удаляет повторные подписки, оставляя самую раннюю,
+    чтобы можно было создать ограничение.
+    """
+    Subscription = apps.get_model('users', 'Subscription')
+    first_ids = Subscription.objects.values('author', 'subscriber').annotate(
+        first_id=Min('id')
+    ).values('first_id')
+    Subscription.objects.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('author', 'subscriber'), name='unique_author_subscriber'),
+        ),
+    ]
@@ -1,11 +1,58 @@
 from django.utils import timezone
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Exists, OuterRef, Value
+from django.contrib.auth.models import AbstractUser, UserManager
 
 from foodgram_back.constants import EMAIL_MAX_LENGTH, USER_NAMES_MAX_LENGTH
 
 
-class User(AbstractUser):
+class UserQuerySet(models.QuerySet):
+    """
+    Набор запросов для пользователей.
+    """
+
+    def with_is_subscribed(self, user):
+        """
+        Аннотирует пользователей признаком подписки на них
+        пользователя, выполняющего запрос.
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=Value(False))
+
+        return self.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(author=OuterRef('pk'),
+                                        subscriber=user)
+        ))
+
+
+class CounterFieldsMixin:
+    """
+    Миксин для моделей со счетчиками, которые меняются только
+    запросами UPDATE с F()-выражениями. Сохранение существующего
+    объекта без update_fields записывает все поля, кроме счетчиков:
+    иначе устаревшие значения в объекте затерли бы одновременные
+    изменения счетчиков.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """
+    Менеджер пользователей с методами из UserQuerySet.
+    """
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """
     Переопределенная модель пользователя с новыми полями согласно заданию.
     """
@@ -21,13 +68,19 @@ class User(AbstractUser):
     last_name = models.CharField(verbose_name='Фамилия',
                                  max_length=USER_NAMES_MAX_LENGTH)
 
-    is_subscribed = models.BooleanField(verbose_name='Подписан',
-                                        default=False)
-
     avatar = models.ImageField(verbose_name='Аватар',
                                upload_to='users/',
                                blank=True, null=True)
 
+    # Счетчики поддерживаются сигналами (см. recipes.signals
+    # и users.signals), пересчитываются командой recalculate_counters.
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов (количество)', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков (количество)', default=0, editable=False
+    )
+
     is_active = models.BooleanField(verbose_name='Активен',
                                     default=True)
 
@@ -43,6 +96,15 @@ class User(AbstractUser):
     last_login = models.DateTimeField(verbose_name='Последний вход в систему',
                                       blank=True, null=True)
 
+    # Время изменения профиля для ETag и Last-Modified,
+    # обновление счетчиков его не меняет.
+    updated_at = models.DateTimeField(verbose_name='Дата изменения',
+                                      auto_now=True)
+
+    objects = CustomUserManager()
+
+    counter_fields = ('recipes_count', 'subscribers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -77,6 +139,12 @@ class Subscription(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'subscriber'],
+                name='unique_author_subscriber'
+            )
+        ]
 
     def __str__(self):
         return f'{self.subscriber} на {self.author}'
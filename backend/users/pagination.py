@@ -1,9 +1,171 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination,
+                                       PageNumberPagination,
+                                       _reverse_ordering)
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Пагинатор по ключу (keyset) с непрозрачными курсорами.
+    Размер страницы задается параметром limit.
+
+    В отличие от CursorPagination, позиция курсора - значения всех
+    полей сортировки, а не только первого. Последнее поле сортировки
+    уникально (id), поэтому позиция однозначна: совпадения значений
+    первых полей не приводят к OFFSET и его ограничению offset_cutoff.
+    """
+    page_size_query_param = 'limit'
+    ordering = 'id'
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """
+        Условие "строка после позиции" в порядке ordering:
+        (a > x) OR (a = x AND b > y) OR ... с учетом направлений.
+        Первое условие a >= x повторено отдельно, чтобы планировщик
+        мог ограничить по нему диапазон индекса.
+        """
+        first_field = ordering[0].lstrip('-')
+        first_lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        condition = Q()
+        equal = {}
+        for order, value in zip(ordering, position):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return Q(**{f'{first_field}__{first_lookup}': position[0]}) & (
+            condition
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Повторяет CursorPagination.paginate_queryset, кроме фильтра
+        # по позиции. Позиции уникальны, поэтому смещение всегда 0.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor[1:]
+
+        ordering = (_reverse_ordering(self.ordering) if reverse
+                    else self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            try:
+                position = json.loads(current_position)
+                if (not isinstance(position, list)
+                        or len(position) != len(ordering)):
+                    raise ValueError
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, position)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[field] for field in fields]
+        else:
+            values = [getattr(instance, field) for field in fields]
+        # Значения передаются строками: из них поля модели
+        # восстанавливают даты и числа при построении фильтра.
+        return json.dumps([str(value) for value in values])
+
+
+class RecipeCursorPagination(CustomCursorPagination):
+    """
+    Пагинатор по ключу для ленты рецептов: курсор строится
+    по (pub_date, id) или по полям сортировки из параметра ordering.
+    """
+    ordering = ('-pub_date', '-id')
 
 
 class CustomLimitPagination(PageNumberPagination):
     """
     Собственный пагинатор для динамической
     пагинации на основе параметра limit в запросе.
+
+    Если в запросе передан параметр cursor (для первой страницы
+    достаточно пустого ?cursor=), пагинация выполняется по ключу
+    cursor_ordering без COUNT(*) и OFFSET.
     """
     page_size_query_param = 'limit'
+    cursor_ordering = CustomCursorPagination.ordering
+    cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if CustomCursorPagination.cursor_query_param in request.query_params:
+            self.cursor_pagination = CustomCursorPagination()
+            self.cursor_pagination.ordering = self.cursor_ordering
+            page = self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+            self.display_page_controls = (
+                self.cursor_pagination.display_page_controls
+            )
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.to_html()
+        return super().to_html()
+
+
+class RecipeLimitPagination(CustomLimitPagination):
+    """
+    Пагинатор для ленты рецептов: курсор строится по (pub_date, id)
+    или по полям сортировки из параметра ordering.
+    """
+    cursor_ordering = RecipeCursorPagination.ordering
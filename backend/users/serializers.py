@@ -4,10 +4,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
-from drf_extra_fields.fields import Base64ImageField
 
+from recipes.fields import ImageVariantsField, StreamingImageField
 from recipes.models import Recipe
-from . import models
 
 User = get_user_model()
 
@@ -19,14 +18,26 @@ class UserSerializer(serializers.ModelSerializer):
     # Устанавливаем пароль как поле только для записи,
     # чтобы он обрабатывался при создании пользвателя.
     password = serializers.CharField(write_only=True, required=True)
-    # Получаем картинку аватара из base64 в запросе.
-    avatar = Base64ImageField(required=False, allow_null=True)
+    # Получаем картинку аватара из base64 или multipart в запросе.
+    avatar = StreamingImageField(required=False, allow_null=True)
+    is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'avatar', 'password')
 
+    def get_is_subscribed(self, obj):
+        # Списки пользователей аннотированы через
+        # UserQuerySet.with_is_subscribed, запрос нужен
+        # только для одиночного объекта без аннотации.
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if not request or not request.user.is_authenticated:
+            return False
+        return obj.subscribers.filter(subscriber=request.user).exists()
+
 
 class UserCreateSerializer(DjoserUserSerializer):
     """
@@ -87,9 +98,11 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
     """
     Дополнительный сериализатор для рецепта c меньшим набором полей.
     """
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class UserWithRecipesSerializer(UserSerializer):
@@ -98,24 +111,38 @@ class UserWithRecipesSerializer(UserSerializer):
     включающий список рецептов и их количество.
     """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count',
-                                             read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
-    def get_recipes(self, obj):
-        request = self.context.get('request')
+    @staticmethod
+    def get_recipes_limit(request):
+        """
+        Возвращает значение параметра recipes_limit из запроса.
+        """
         limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
+        if limit is None:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise serializers.ValidationError(
+                'Параметр ограничения для рецептов - не число'
+            )
+        if limit < 0:
+            raise serializers.ValidationError(
+                'Параметр ограничения для рецептов - отрицательный'
+            )
+        return limit
 
+    def get_recipes(self, obj):
+        # Список подписок строится без сериализатора,
+        # см. recipes.representations.get_subscriptions.
+        recipes = obj.recipes.all()
+        limit = self.get_recipes_limit(self.context.get('request'))
         if limit is not None:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                raise serializers.ValidationError(
-                    'Параметр ограничения для рецептов - не число'
-                )
+            recipes = recipes[:limit]
 
         return ShortRecipeSerializer(recipes, many=True).data
 
@@ -124,7 +151,7 @@ class UserAvatarSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления или удаления аватара.
     """
-    avatar = Base64ImageField(required=True)
+    avatar = StreamingImageField(required=True)
 
     class Meta:
         model = User
@@ -142,46 +169,3 @@ class PasswordChangeSerializer(serializers.Serializer):
         if not self.context['request'].user.check_password(value):
             raise serializers.ValidationError('Неверный пароль')
         return value
-
-
-class SubscribeSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = models.Subscription
-        exclude = ('id',)
-
-    def validate(self, data):
-        author = data.get('author')
-        subscriber = data.get('subscriber')
-
-        if author == subscriber:
-            raise serializers.ValidationError('Нельзя подписаться на себя')
-
-        if models.Subscription.objects.filter(
-            author=author, subscriber=subscriber
-        ).exists():
-            raise serializers.ValidationError('Уже подписан')
-
-        return data
-
-
-class UnsubscribeSerializer(serializers.Serializer):
-    author = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    subscriber = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-
-    def validate(self, data):
-        author = data['author']
-        subscriber = data['subscriber']
-
-        if author == subscriber:
-            raise serializers.ValidationError('Нельзя отписаться от себя')
-
-        if not models.Subscription.objects.filter(
-            author=author,
-            subscriber=subscriber
-        ).exists():
-            raise serializers.ValidationError(
-                'И так не подписан на этого пользователя'
-            )
-
-        return data
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.utils import update_counter
+from .models import Subscription
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Subscription)
+def increase_subscribers_count(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        update_counter(User, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrease_subscribers_count(sender, instance, **kwargs):
+    update_counter(User, instance.author_id, 'subscribers_count', -1)
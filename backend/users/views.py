@@ -1,13 +1,25 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.generics import (ListCreateAPIView,
                                      RetrieveAPIView,
                                      ListAPIView)
 
+from recipes.conditional import ConditionalGetMixin
+from recipes.parsers import IMAGE_UPLOAD_PARSERS
+from recipes.renderers import FastJSONRenderer
+from recipes.representations import (USER_WITH_RECIPES_COLUMNS,
+                                     get_subscriptions)
+from recipes.utils import delete_rows, update_counter
 from . import serializers, pagination, models
 
 User = get_user_model()
@@ -18,6 +30,9 @@ class UserListCreateView(ListCreateAPIView):
     pagination_class = pagination.CustomLimitPagination
     permission_classes = (AllowAny,)
 
+    def get_queryset(self):
+        return User.objects.with_is_subscribed(self.request.user)
+
     # Решил использовать отдельный сериализатор для создания.
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -25,13 +40,27 @@ class UserListCreateView(ListCreateAPIView):
         return serializers.UserSerializer
 
 
-class UserDetailView(RetrieveAPIView):
+class UserDetailView(ConditionalGetMixin, RetrieveAPIView):
     """
     Представление для полученя профиля любого пользователя.
+    Профиль отдается с ETag по времени его изменения.
     """
     queryset = User.objects.all()
     serializer_class = serializers.UserSerializer
 
+    def get_queryset(self):
+        return User.objects.with_is_subscribed(self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        user = get_object_or_404(
+            self.get_queryset().only('id', 'updated_at'), pk=kwargs['pk']
+        )
+        return self.conditional_response(
+            self.get_etag(user.id, user.updated_at, user.is_subscribed),
+            self.get_last_modified(user.updated_at),
+            partial(super().retrieve, request, *args, **kwargs)
+        )
+
 
 class UserMeView(RetrieveAPIView):
     """
@@ -48,8 +77,10 @@ class UserMeView(RetrieveAPIView):
 class UserAvatarView(APIView):
     """
     Представление для добавления, изменения и удаления аватара.
+    Аватар принимается строкой base64 в json или файлом в multipart.
     """
     permission_classes = (IsAuthenticated,)
+    parser_classes = IMAGE_UPLOAD_PARSERS
 
     def put(self, request, *args, **kwargs):
         serializer = serializers.UserAvatarSerializer(
@@ -90,54 +121,74 @@ class PasswordChangeView(APIView):
 class SubscriptionListView(ListAPIView):
     """
     Представление для вывода списка подписок пользователя.
+    Список строится из строк values_list без DRF-сериализатора,
+    в том же виде, что и UserWithRecipesSerializer.
     """
     serializer_class = serializers.UserWithRecipesSerializer
     pagination_class = pagination.CustomLimitPagination
     permission_classes = (IsAuthenticated,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
 
     def get_queryset(self):
-        authors = User.objects.filter(
+        return User.objects.filter(
             subscribers__subscriber=self.request.user
-        ).prefetch_related('recipes')
+        ).with_is_subscribed(self.request.user)
 
-        return authors
+    def list(self, request, *args, **kwargs):
+        limit = serializers.UserWithRecipesSerializer.get_recipes_limit(
+            request
+        )
+        page = self.paginate_queryset(self.get_queryset().values_list(
+            *USER_WITH_RECIPES_COLUMNS, named=True
+        ))
+        # Рецепты ограничиваются в SQL через ROW_NUMBER()
+        # с разбиением по автору, лишние не загружаются.
+        return self.get_paginated_response(
+            get_subscriptions(page, request, limit)
+        )
 
 
 class SubscriptionView(APIView):
     """
     Представления для подписки на пользователя или ее отмены.
+    Повторная подписка отсекается уникальным ограничением в базе.
     """
     def post(self, request, user_id):
         author = get_object_or_404(User, id=user_id)
-        serializer = serializers.SubscribeSerializer(
-            data={
-                'author': author.id,
-                'subscriber': request.user.id
-            }
-        )
-        serializer.is_valid(raise_exception=True)
-        subscribtion = serializer.save()
+        if author == request.user:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Нельзя подписаться на себя'
+            ]})
+        try:
+            with transaction.atomic():
+                models.Subscription.objects.create(author=author,
+                                                   subscriber=request.user)
+        except IntegrityError:
+            raise ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['Уже подписан']}
+            )
+
+        author.is_subscribed = True
         response_serializer = serializers.UserWithRecipesSerializer(
-            subscribtion.author, context={'request': request})
+            author, context={'request': request})
 
         return Response(response_serializer.data,
                         status=status.HTTP_201_CREATED)
 
     def delete(self, request, user_id):
-        author = get_object_or_404(User, id=user_id)
-
-        serializer = serializers.UnsubscribeSerializer(
-            data={
-                'author': author.id,
-                'subscriber': request.user.id
-            },
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-
-        models.Subscription.objects.filter(
-            author=author,
-            subscriber=request.user
-        ).delete()
-
+        with transaction.atomic():
+            deleted = delete_rows(models.Subscription.objects.filter(
+                author_id=user_id, subscriber=request.user
+            ))
+            if deleted:
+                # Строки удалены без сигналов, счетчик обновляется здесь.
+                update_counter(User, user_id, 'subscribers_count',
+                               -deleted)
+
+        if not deleted:
+            author = get_object_or_404(User, id=user_id)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Нельзя отписаться от себя' if author == request.user
+                else 'И так не подписан на этого пользователя'
+            ]})
         return Response(status=status.HTTP_204_NO_CONTENT)